@@ -0,0 +1,165 @@
+# File: bus_optimizer.py
+
+import argparse
+import os
+import time
+import numpy as np
+from logger import log
+
+
+class BusOptimizer:
+    """
+    Checks the settings that add dead time to every Dynamixel transaction and, when allowed,
+    changes them:
+
+    - Return Delay Time (EEPROM, 2 us units): the servo waits this long before replying; the
+      factory default of 250 is 500 us per status packet. Needs torque off to write.
+    - Status Return Level (RAM): 2 replies to every instruction, 1 only to reads and pings, so
+      writes no longer wait for a status packet. DynamixelController.write_register follows it.
+    - The FTDI USB-serial latency_timer in sysfs (ms): received bytes can sit in the adapter
+      this long before reaching the host; the default is 16.
+
+    optimize() reads the settings (a few register reads) and returns a report dictionary;
+    with `measure` it also times the round trip of the control loop's sync read before and
+    after, which takes `iterations` bus transactions each.
+    """
+
+    def __init__(self, dynamixel_controller, allow_writes=False, return_delay_time=0, status_return_level=1, latency_timer=1):
+        self.controller = dynamixel_controller
+        self.allow_writes = allow_writes
+        self.target_return_delay_time = return_delay_time
+        self.target_status_return_level = status_return_level
+        self.target_latency_timer = latency_timer
+
+    @property
+    def servo_ids(self):
+        return (self.controller.PAN_SERVO_ID, self.controller.TILT_SERVO_ID)
+
+    def latency_timer_path(self):
+        device = os.path.basename(os.path.realpath(self.controller.DEVICE_PORT))
+        return f"/sys/bus/usb-serial/devices/{device}/latency_timer"
+
+    def read_latency_timer(self):
+        """The adapter's latency timer in ms, or None when the port is not a USB-serial adapter."""
+        try:
+            with open(self.latency_timer_path(), "r") as file:
+                return int(file.read().strip())
+        except (OSError, ValueError):
+            return None
+
+    def write_latency_timer(self, value):
+        try:
+            with open(self.latency_timer_path(), "w") as file:
+                file.write(str(value))
+            return True
+        except OSError as e:
+            log.warning("Could not set %s: %s (needs root or a udev rule)", self.latency_timer_path(), e)
+            return False
+
+    def read_register(self, servo_id, address):
+        controller = self.controller
+        value, dxl_comm_result, dxl_error = controller.packetHandler.read1ByteTxRx(controller.portHandler, servo_id, address)
+        if dxl_comm_result != controller.COMM_SUCCESS:
+            raise Exception(f"Error occurred while reading address {address} of servo {servo_id}")
+        return value
+
+    def read_settings(self):
+        return {
+            servo_id: {
+                "return_delay_time": self.read_register(servo_id, self.controller.ADDR_RETURN_DELAY_TIME),
+                "status_return_level": self.read_register(servo_id, self.controller.ADDR_STATUS_RETURN_LEVEL),
+            }
+            for servo_id in self.servo_ids
+        }
+
+    def measure_round_trip(self, iterations=50):
+        """Median and 99th percentile in ms of the control loop's present position sync read."""
+        samples = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            self.controller.get_present_position()
+            samples.append(time.perf_counter() - start)
+        samples = np.array(samples) * 1000
+        return {"p50_ms": float(np.percentile(samples, 50)), "p99_ms": float(np.percentile(samples, 99))}
+
+    def _set_return_delay_time(self, servo_id, value):
+        controller = self.controller
+        # EEPROM area: only writable with torque off
+        controller.set_torque(servo_id, False)
+        try:
+            dxl_comm_result, dxl_error = controller.write_register(servo_id, controller.ADDR_RETURN_DELAY_TIME, 1, value)
+            if dxl_comm_result != controller.COMM_SUCCESS or dxl_error != 0:
+                log.warning("Could not set Return Delay Time of servo %s", servo_id)
+        finally:
+            controller.set_torque(servo_id, True)
+
+    def _set_status_return_level(self, level):
+        controller = self.controller
+        for servo_id in self.servo_ids:
+            # The reply to this write already follows the new level, so never wait for one
+            controller.packetHandler.write1ByteTxOnly(controller.portHandler, servo_id, controller.ADDR_STATUS_RETURN_LEVEL, level)
+        time.sleep(0.01)
+        controller.portHandler.clearPort()
+        controller.status_return_level = level
+
+    def optimize(self, iterations=50, measure=True):
+        report = {
+            "settings_before": self.read_settings(),
+            "latency_timer_before": self.read_latency_timer(),
+        }
+        if measure:
+            report["round_trip_before"] = self.measure_round_trip(iterations)
+
+        if self.allow_writes:
+            for servo_id, settings in report["settings_before"].items():
+                if settings["return_delay_time"] != self.target_return_delay_time:
+                    self._set_return_delay_time(servo_id, self.target_return_delay_time)
+            if any(settings["status_return_level"] != self.target_status_return_level for settings in report["settings_before"].values()):
+                self._set_status_return_level(self.target_status_return_level)
+            latency_timer = report["latency_timer_before"]
+            if latency_timer is not None and latency_timer > self.target_latency_timer:
+                self.write_latency_timer(self.target_latency_timer)
+
+            report["settings_after"] = self.read_settings()
+            report["latency_timer_after"] = self.read_latency_timer()
+            if measure:
+                report["round_trip_after"] = self.measure_round_trip(iterations)
+        return report
+
+    @staticmethod
+    def format_report(report):
+        lines = []
+        for servo_id, settings in report["settings_before"].items():
+            after = report.get("settings_after", {}).get(servo_id, settings)
+            lines.append(f"Servo {servo_id}: Return Delay Time {settings['return_delay_time'] * 2} us -> {after['return_delay_time'] * 2} us, "
+                         f"Status Return Level {settings['status_return_level']} -> {after['status_return_level']}")
+        latency_timer = report["latency_timer_before"]
+        if latency_timer is None:
+            lines.append("USB latency_timer: not a USB-serial adapter")
+        else:
+            lines.append(f"USB latency_timer: {latency_timer} ms -> {report.get('latency_timer_after', latency_timer)} ms")
+        if "round_trip_before" in report:
+            before = report["round_trip_before"]
+            lines.append(f"Round trip before: p50 {before['p50_ms']:.3f} ms, p99 {before['p99_ms']:.3f} ms")
+        if "round_trip_after" in report:
+            after = report["round_trip_after"]
+            lines.append(f"Round trip after:  p50 {after['p50_ms']:.3f} ms, p99 {after['p99_ms']:.3f} ms")
+        return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report and optionally tune Dynamixel bus latency settings")
+    parser.add_argument('--device_port', default="/dev/ttyUSB0", help="Dynamixel serial port")
+    parser.add_argument('--apply', action="store_true", help="Write the faster settings (Return Delay Time is stored in EEPROM)", default=False)
+    parser.add_argument('--return_delay', type=int, default=0, help="Return Delay Time to set (2 us units)")
+    parser.add_argument('--status_return_level', type=int, choices=(1, 2), default=1, help="Status Return Level to set")
+    parser.add_argument('-n', '--iterations', type=int, default=100, help="Transactions per round-trip measurement")
+    args = parser.parse_args()
+
+    from dynamixel_controller import DynamixelController
+    controller = DynamixelController(args.device_port, 1000000, 1, 2)
+    try:
+        optimizer = BusOptimizer(controller, allow_writes=args.apply, return_delay_time=args.return_delay, status_return_level=args.status_return_level)
+        print(BusOptimizer.format_report(optimizer.optimize(args.iterations)), flush=True)
+    finally:
+        controller.close()
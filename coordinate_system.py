@@ -1,5 +1,6 @@
 # File: coordinate_system.py
 
+import cv2
 import numpy as np
 
 class CoordinateSystem:
@@ -13,46 +14,51 @@ class CoordinateSystem:
     IMAGE_CENTER_X = IMAGE_WIDTH_PIXELS // 2
     IMAGE_CENTER_Y = IMAGE_HEIGHT_PIXELS // 2
 
+    @staticmethod
+    def _result(values):
+        # Scalars in, scalars out; arrays in, arrays out
+        return values.item() if values.ndim == 0 else values
+
     @staticmethod
     def pixels_to_angle(x_pixels, y_pixels):
         """
         Convert pixel coordinates to servo angles using the camera's intrinsic parameters.
-        Angles are relative to the image center.
+        Angles are relative to the image center. Accepts scalars or arrays of N points and
+        never modifies its arguments.
         """
         # Correct for image center
-        x_pixels -= CoordinateSystem.IMAGE_CENTER_X
-        y_pixels -= CoordinateSystem.IMAGE_CENTER_Y
+        x_pixels = np.asarray(x_pixels, dtype=np.float64) - CoordinateSystem.IMAGE_CENTER_X
+        y_pixels = np.asarray(y_pixels, dtype=np.float64) - CoordinateSystem.IMAGE_CENTER_Y
 
         x_mm = x_pixels * CoordinateSystem.CAMERA_PIXEL_SIZE_MM
         y_mm = y_pixels * CoordinateSystem.CAMERA_PIXEL_SIZE_MM
 
-        theta_x_rad = np.arctan2(x_mm, CoordinateSystem.CAMERA_FOCAL_LENGTH_MM)
-        theta_y_rad = np.arctan2(y_mm, CoordinateSystem.CAMERA_FOCAL_LENGTH_MM)
+        theta_x_deg = np.degrees(np.arctan2(x_mm, CoordinateSystem.CAMERA_FOCAL_LENGTH_MM))
+        theta_y_deg = np.degrees(np.arctan2(y_mm, CoordinateSystem.CAMERA_FOCAL_LENGTH_MM))
 
-        theta_x_deg = np.degrees(theta_x_rad)
-        theta_y_deg = np.degrees(theta_y_rad)
-
-        return theta_x_deg, theta_y_deg
+        return CoordinateSystem._result(theta_x_deg), CoordinateSystem._result(theta_y_deg)
 
     @staticmethod
     def calculate_interception_point(x_pixels, y_pixels, vx_pixels, vy_pixels, lead_time):
         """
         Calculate interception point given velocity and lead time.
+        Every argument may be a scalar or an array of N values.
         """
-        interception_x = x_pixels + vx_pixels * lead_time
-        interception_y = y_pixels + vy_pixels * lead_time
+        interception_x = np.asarray(x_pixels, dtype=np.float64) + np.asarray(vx_pixels, dtype=np.float64) * lead_time
+        interception_y = np.asarray(y_pixels, dtype=np.float64) + np.asarray(vy_pixels, dtype=np.float64) * lead_time
 
-        return interception_x, interception_y
+        return CoordinateSystem._result(interception_x), CoordinateSystem._result(interception_y)
 
     @staticmethod
     def calculate_velocity(x_pixels, y_pixels, prev_x_pixels, prev_y_pixels, dt):
         """
         Calculate velocity given current and previous positions, and the time difference.
+        Every argument may be a scalar or an array of N values.
         """
-        vx_pixels = (x_pixels - prev_x_pixels) / dt
-        vy_pixels = (y_pixels - prev_y_pixels) / dt
+        vx_pixels = (np.asarray(x_pixels, dtype=np.float64) - prev_x_pixels) / dt
+        vy_pixels = (np.asarray(y_pixels, dtype=np.float64) - prev_y_pixels) / dt
 
-        return vx_pixels, vy_pixels
+        return CoordinateSystem._result(vx_pixels), CoordinateSystem._result(vy_pixels)
 
     @staticmethod
     def pixels_to_servo_command(x_pixels, y_pixels):
@@ -61,23 +67,89 @@ class CoordinateSystem:
         """
         theta_x_deg, theta_y_deg = CoordinateSystem.pixels_to_angle(x_pixels, y_pixels)
 
-        # Normalize to servo command range [0, 4095]
-        pan_command = int((theta_x_deg / CoordinateSystem.PAN_SERVO_MAX_ANGLE_DEG) * 4095)
-        tilt_command = int((theta_y_deg / CoordinateSystem.TILT_SERVO_MAX_ANGLE_DEG) * 4095)
+        # Normalize to servo command range [0, 4095], truncating like int()
+        pan_command = (np.asarray(theta_x_deg) / CoordinateSystem.PAN_SERVO_MAX_ANGLE_DEG * 4095).astype(np.int64)
+        tilt_command = (np.asarray(theta_y_deg) / CoordinateSystem.TILT_SERVO_MAX_ANGLE_DEG * 4095).astype(np.int64)
 
-        return pan_command, tilt_command
+        return CoordinateSystem._result(pan_command), CoordinateSystem._result(tilt_command)
 
     @staticmethod
     def image_position_to_servo_goal(img_pos, img_size, servo_min, servo_max):
         """
         Translate a position in the image (e.g., the center of a bounding box) to a goal position for a servo.
-        img_pos is the position in the image (either x or y coordinate).
+        img_pos is the position in the image (either x or y coordinate), a scalar or an array of N positions.
         img_size is the size of the image (width for x coordinate, height for y coordinate).
         servo_min and servo_max are the minimum and maximum positions for the servo.
         """
         # Normalize image position to range [0, 1]
-        norm_img_pos = img_pos / img_size
+        norm_img_pos = np.asarray(img_pos, dtype=np.float64) / img_size
         # Translate to servo position
         servo_goal = servo_min + norm_img_pos * (servo_max - servo_min)
-        return int(servo_goal)
+        return CoordinateSystem._result(servo_goal.astype(np.int64))
+
+
+
+class OrientationTransform:
+    """
+    Camera mounting orientation, built once from the flip and reverse settings.
+
+    Camera-space detections and tag corners are mapped to display/control space with
+    vectorized NumPy operations; the image itself is only flipped (once, with a single
+    cv2.flip) when it is actually going to be shown.
+    """
 
+    def __init__(self, flip_horizontal=False, flip_vertical=False, reverse_pan=False, reverse_tilt=False):
+        self.flip_horizontal = bool(flip_horizontal)
+        self.flip_vertical = bool(flip_vertical)
+        self.reverse_pan = bool(reverse_pan)
+        self.reverse_tilt = bool(reverse_tilt)
+
+        # Per-axis scale and offset so x' = offset + scale * x, for normalized coordinates
+        self._scale = np.array([-1.0 if self.flip_horizontal else 1.0, -1.0 if self.flip_vertical else 1.0])
+        self._offset = np.array([1.0 if self.flip_horizontal else 0.0, 1.0 if self.flip_vertical else 0.0])
+        self._servo_scale = np.array([-1.0 if self.reverse_pan else 1.0, -1.0 if self.reverse_tilt else 1.0])
+        self._servo_offset = np.array([1.0 if self.reverse_pan else 0.0, 1.0 if self.reverse_tilt else 0.0])
+
+        if self.flip_horizontal and self.flip_vertical:
+            self._flip_code = -1
+        elif self.flip_horizontal:
+            self._flip_code = 1
+        elif self.flip_vertical:
+            self._flip_code = 0
+        else:
+            self._flip_code = None
+
+    @property
+    def is_identity(self):
+        return self._flip_code is None
+
+    def apply_boxes(self, boxes):
+        """
+        Map an (N, 4) array of normalized [xmin, ymin, xmax, ymax] boxes to display space.
+        Returns a new array; min/max stay ordered after a flip.
+        """
+        boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        if self.is_identity:
+            return boxes.copy()
+        scale = np.tile(self._scale, 2).astype(np.float32)
+        offset = np.tile(self._offset, 2).astype(np.float32)
+        mapped = offset + scale * boxes
+        return np.concatenate([np.minimum(mapped[:, :2], mapped[:, 2:]), np.maximum(mapped[:, :2], mapped[:, 2:])], axis=1)
+
+    def apply_points(self, points, width, height):
+        """Map an (N, 2) array of camera pixel coordinates to display pixels (also its own inverse)."""
+        points = np.asarray(points, dtype=np.float64)
+        if self.is_identity:
+            return points.copy()
+        size = np.array([width, height], dtype=np.float64)
+        return self._offset * size + self._scale * points
+
+    def apply_frame(self, frame):
+        """Return the frame as it should be displayed; no copy when no flip is needed."""
+        if self._flip_code is None:
+            return frame
+        return cv2.flip(frame, self._flip_code)
+
+    def servo_position(self, point):
+        """Apply reverse_pan/reverse_tilt to normalized display coordinates."""
+        return self._servo_offset + self._servo_scale * np.asarray(point, dtype=np.float64)
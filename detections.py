@@ -0,0 +1,65 @@
+# File: detections.py
+
+import numpy as np
+
+# One row per detection; box is [xmin, ymin, xmax, ymax] normalized to <0..1>
+DETECTION_DTYPE = np.dtype([
+    ("label", np.int32),
+    ("confidence", np.float32),
+    ("box", np.float32, (4,)),
+])
+
+
+class DetectionBuffer:
+    """
+    Converts depthai detection lists into DETECTION_DTYPE arrays without per-frame allocation.
+
+    Each fill() returns a view into the next of `slots` preallocated buffers, so an array
+    stays valid for `slots` frames (enough for frames that are held back by the tag
+    search pipeline). Copy it if it has to live longer.
+    """
+
+    def __init__(self, capacity=64, slots=8):
+        self.capacity = capacity
+        self._buffers = np.zeros((slots, capacity), dtype=DETECTION_DTYPE)
+        self._slot = 0
+
+    def fill(self, detections):
+        buffer = self._buffers[self._slot]
+        self._slot = (self._slot + 1) % len(self._buffers)
+
+        count = min(len(detections), self.capacity)
+        labels = buffer["label"]
+        confidences = buffer["confidence"]
+        boxes = buffer["box"]
+        for i in range(count):
+            detection = detections[i]
+            labels[i] = detection.label
+            confidences[i] = detection.confidence
+            boxes[i] = (detection.xmin, detection.ymin, detection.xmax, detection.ymax)
+        return buffer[:count]
+
+
+def from_records(records):
+    """Build a detection array from dicts with label, confidence and xmin/ymin/xmax/ymax."""
+    array = np.zeros(len(records), dtype=DETECTION_DTYPE)
+    for i, record in enumerate(records):
+        array[i] = (record.get("label", 0), record["confidence"], (record["xmin"], record["ymin"], record["xmax"], record["ymax"]))
+    return array
+
+
+def to_records(array):
+    return [
+        {"label": int(label), "confidence": float(confidence), "xmin": float(box[0]), "ymin": float(box[1]), "xmax": float(box[2]), "ymax": float(box[3])}
+        for label, confidence, box in zip(array["label"], array["confidence"], array["box"])
+    ]
+
+
+def filter_confidence(array, threshold):
+    return array[array["confidence"] >= threshold]
+
+
+def to_pixels(boxes, width, height):
+    """Normalized (N, 4) boxes to integer pixel boxes, clipped to the frame."""
+    scale = np.array([width, height, width, height], dtype=np.float32)
+    return (np.clip(boxes, 0, 1) * scale).astype(np.int32)
@@ -1,8 +1,21 @@
 import dynamixel_sdk as sdk
-from dynamixel_sdk import DXL_LOBYTE, DXL_LOWORD, DXL_HIBYTE, DXL_HIWORD
 from pid_controller import PIDController
+from logger import log
 
 import time
+import struct
+import numpy as np
+
+# Moving (122), Moving Status (123), Present PWM (124), Present Current (126), Present Velocity (128)
+# and Present Position (132): one contiguous 14-byte block of the MX-series (2.0) control table
+TELEMETRY_DTYPE = np.dtype([
+    ("moving", "u1"),
+    ("moving_status", "u1"),
+    ("pwm", "<i2"),
+    ("current", "<i2"),
+    ("velocity", "<i4"),
+    ("position", "<i4"),
+])
 
 class DynamixelController:
 
@@ -14,7 +27,7 @@ class DynamixelController:
     PAN_CENTER_POSITION = 2500
     TILT_CENTER_POSITION = 1700
 
-    def __init__(self, device_port, baudrate, pan_servo_id, tilt_servo_id):
+    def __init__(self, device_port, baudrate, pan_servo_id, tilt_servo_id, telemetry=False):
         # Protocol version
         self.PROTOCOL_VERSION = 2.0
 
@@ -27,12 +40,17 @@ class DynamixelController:
         # Control table address for Protocol 2.0 (MX series)
         self.ADDR_MX_TORQUE_ENABLE = 64
         self.ADDR_MX_GOAL_POSITION = 116
-        self.ADDR_MX_GOAL_SPEED = 112
+        self.ADDR_MX_GOAL_SPEED = 112  # Profile Velocity
+        self.ADDR_MX_PROFILE_ACCELERATION = 108
         self.ADDR_OPERATING_MODE = 11 
         self.LEN_GOAL_POSITION = 4  # Data Byte Length
         self.ADDR_MX_PRESENT_POSITION = 132
         self.LEN_PRESENT_POSITION = 4  # Data Byte Length
         self.EXT_POSITION_CONTROL_MODE   = 4
+        self.ADDR_MX_TELEMETRY = 122
+        self.ADDR_RETURN_DELAY_TIME = 9
+        self.ADDR_STATUS_RETURN_LEVEL = 68
+        self.LEN_TELEMETRY = TELEMETRY_DTYPE.itemsize
 
         # Communication result
         self.COMM_SUCCESS = sdk.COMM_SUCCESS
@@ -52,19 +70,47 @@ class DynamixelController:
         if not self.portHandler.setBaudRate(self.BAUDRATE):
             raise Exception("Failed to set the Dynamixel baudrate")
 
+        # Status Return Level is RAM and may still be lowered from an earlier run, so put it back to
+        # "reply to everything" without waiting for a reply; see write_register and bus_optimizer.py
+        self.status_return_level = 2
+        for servo_id in (self.PAN_SERVO_ID, self.TILT_SERVO_ID):
+            self.packetHandler.write1ByteTxOnly(self.portHandler, servo_id, self.ADDR_STATUS_RETURN_LEVEL, 2)
+        time.sleep(0.01)  # Let any status replies arrive, then drop them
+        self.portHandler.clearPort()
+
         # Enable Dynamixel torque
         self.set_torque(self.PAN_SERVO_ID, True)
         self.set_torque(self.TILT_SERVO_ID, True)
         self.set_PAN_control_mode(self.PAN_SERVO_ID)
 
-        # Initialize GroupSyncWrite instance
-        self.groupSyncWrite = sdk.GroupSyncWrite(self.portHandler, self.packetHandler, self.ADDR_MX_GOAL_POSITION, self.LEN_GOAL_POSITION)
-
         # Initialize GroupSyncRead instance
         self.groupSyncRead = sdk.GroupSyncRead(self.portHandler, self.packetHandler, self.ADDR_MX_PRESENT_POSITION, self.LEN_PRESENT_POSITION)
         self.groupSyncRead.addParam(self.PAN_SERVO_ID)
         self.groupSyncRead.addParam(self.TILT_SERVO_ID)
 
+        # Telemetry mode: get_present_position reads position, velocity, current and moving status of
+        # both servos in one sync read and decodes them straight out of one receive buffer
+        self.telemetry_mode = telemetry
+        self.groupTelemetryRead = sdk.GroupSyncRead(self.portHandler, self.packetHandler, self.ADDR_MX_TELEMETRY, self.LEN_TELEMETRY)
+        self.groupTelemetryRead.addParam(self.PAN_SERVO_ID)
+        self.groupTelemetryRead.addParam(self.TILT_SERVO_ID)
+        self._telemetry_buffer = bytearray(2 * self.LEN_TELEMETRY)
+        self.telemetry = np.frombuffer(self._telemetry_buffer, dtype=TELEMETRY_DTYPE)  # Row 0 pan, row 1 tilt
+
+        # Sync write parameters (ID followed by the 4-byte goal) for both servos, pan only and tilt
+        # only, allocated once and patched in place for every move
+        self._goal_format = struct.Struct("<i")
+        self._goal_params = {
+            (True, True): bytearray([self.PAN_SERVO_ID, 0, 0, 0, 0, self.TILT_SERVO_ID, 0, 0, 0, 0]),
+            (True, False): bytearray([self.PAN_SERVO_ID, 0, 0, 0, 0]),
+            (False, True): bytearray([self.TILT_SERVO_ID, 0, 0, 0, 0]),
+        }
+        self._profile_goal = None
+        # A profile goal is written once with TxOnly; if the servos have not moved toward it
+        # this long after the write, the packet is assumed lost and the goal is sent again
+        self.profile_resend_timeout = 0.1
+        self._profile_goal_sent = None  # (time of the write, (pan, tilt) distance to the goal at the last check)
+
         # Initialize PID Controller
         self.pan_pid = PIDController(kp=3, ki=0.0, kd=3)
         self.tilt_pid = PIDController(kp=2.0, ki=0.0, kd=0.0)
@@ -79,7 +125,7 @@ class DynamixelController:
 
     def set_PAN_control_mode(self, servo_id):
         # Set operating mode to extended position control mode
-        dxl_comm_result, dxl_error = self.packetHandler.write1ByteTxRx(self.portHandler, servo_id, self.ADDR_OPERATING_MODE, self.EXT_POSITION_CONTROL_MODE)
+        dxl_comm_result, dxl_error = self.write_register(servo_id, self.ADDR_OPERATING_MODE, 1, self.EXT_POSITION_CONTROL_MODE)
         if dxl_comm_result != self.COMM_SUCCESS:
             print("%s" % self.packetHandler.getTxRxResult(dxl_comm_result))
         elif dxl_error != 0:
@@ -87,10 +133,19 @@ class DynamixelController:
         else:
             print("Operating mode changed to extended position control mode.")
 
+    def write_register(self, servo_id, address, length, value):
+        """
+        Write a 1, 2 or 4 byte register. Waits for the status packet only when the servos send
+        one for writes (Status Return Level 2); otherwise the error is always reported as 0.
+        """
+        if self.status_return_level >= 2:
+            write = {1: self.packetHandler.write1ByteTxRx, 2: self.packetHandler.write2ByteTxRx, 4: self.packetHandler.write4ByteTxRx}[length]
+            return write(self.portHandler, servo_id, address, value)
+        write = {1: self.packetHandler.write1ByteTxOnly, 2: self.packetHandler.write2ByteTxOnly, 4: self.packetHandler.write4ByteTxOnly}[length]
+        return write(self.portHandler, servo_id, address, value), 0
+
     def set_torque(self, servo_id, enable):
-        dxl_comm_result, dxl_error = self.packetHandler.write1ByteTxRx(
-            self.portHandler, servo_id, self.ADDR_MX_TORQUE_ENABLE, int(enable)
-        )
+        dxl_comm_result, dxl_error = self.write_register(servo_id, self.ADDR_MX_TORQUE_ENABLE, 1, int(enable))
         if dxl_comm_result != self.COMM_SUCCESS:
             raise Exception("Error occurred while enabling/disabling torque")
     # Clamp servo position to the valid range
@@ -100,7 +155,7 @@ class DynamixelController:
 
     def set_speed(self, servo_id, dxl_goal_speed):
         # Write the goal speed
-        dxl_comm_result, dxl_error = self.packetHandler.write4ByteTxRx(self.portHandler, servo_id, self.ADDR_MX_GOAL_SPEED, dxl_goal_speed)
+        dxl_comm_result, dxl_error = self.write_register(servo_id, self.ADDR_MX_GOAL_SPEED, 4, dxl_goal_speed)
         if dxl_comm_result != self.COMM_SUCCESS:
             print("%s" % self.packetHandler.getTxRxResult(dxl_comm_result))
         elif dxl_error != 0:
@@ -112,45 +167,80 @@ class DynamixelController:
             goal_position = self.clamp_servo_position(goal_position, min_position, max_position)
         return goal_position
     def set_goal_position(self, pan_goal, tilt_goal):
+        if pan_goal is None and tilt_goal is None:
+            return True
+
+        # Patch the goals into the preallocated sync write parameters
+        param = self._goal_params[(pan_goal is not None, tilt_goal is not None)]
+        offset = 1
         if pan_goal is not None:
-            pan_goal = int(pan_goal)
-            # Convert pan goal to byte array
-            pan_param_goal_position = [
-                DXL_LOBYTE(DXL_LOWORD(pan_goal)),
-                DXL_HIBYTE(DXL_LOWORD(pan_goal)),
-                DXL_LOBYTE(DXL_HIWORD(pan_goal)),
-                DXL_HIBYTE(DXL_HIWORD(pan_goal))
-            ]
-            # Add goal position value to the Syncwrite storage for PAN servo
-            pan_addparam_result = self.groupSyncWrite.addParam(self.PAN_SERVO_ID, pan_param_goal_position)
-            if not pan_addparam_result:
-                print(f"[ID:{self.PAN_SERVO_ID}] groupSyncWrite addparam failed")
-    
+            self._goal_format.pack_into(param, offset, int(pan_goal))
+            offset += 1 + self.LEN_GOAL_POSITION
         if tilt_goal is not None:
-            tilt_goal = int(tilt_goal)
-            # Convert tilt goal to byte array
-            tilt_param_goal_position = [
-                DXL_LOBYTE(DXL_LOWORD(tilt_goal)),
-                DXL_HIBYTE(DXL_LOWORD(tilt_goal)),
-                DXL_LOBYTE(DXL_HIWORD(tilt_goal)),
-                DXL_HIBYTE(DXL_HIWORD(tilt_goal))
-            ]
-            # Add goal position value to the Syncwrite storage for TILT servo
-            tilt_addparam_result = self.groupSyncWrite.addParam(self.TILT_SERVO_ID, tilt_param_goal_position)
-            if not tilt_addparam_result:
-                print(f"[ID:{self.TILT_SERVO_ID}] groupSyncWrite addparam failed")
-    
+            self._goal_format.pack_into(param, offset, int(tilt_goal))
+
         # Syncwrite goal position
-        dxl_comm_result = self.groupSyncWrite.txPacket()
+        dxl_comm_result = self.packetHandler.syncWriteTxOnly(self.portHandler, self.ADDR_MX_GOAL_POSITION, self.LEN_GOAL_POSITION, param, len(param))
         if dxl_comm_result != self.COMM_SUCCESS:
-            print("%s" % self.packetHandler.getTxRxResult(dxl_comm_result))
+            log.warning("%s", self.packetHandler.getTxRxResult(dxl_comm_result), every=1.0)
             return False
-    
-        # Clear Syncwrite parameter storage
-        self.groupSyncWrite.clearParam()
-    
+
         return True
 
+    def set_motion_profile(self, profile_velocity, profile_acceleration):
+        """
+        Program Profile Acceleration (108) and Profile Velocity (112) on both servos with one
+        sync write; the firmware then plans every goal position move itself. Units are the
+        MX-series (2.0) ones, 0.229 rpm and 214.577 rev/min^2; 0 means unlimited.
+        """
+        # The two registers are adjacent, so both fit into one 8-byte block per servo
+        param = bytearray()
+        for servo_id in (self.PAN_SERVO_ID, self.TILT_SERVO_ID):
+            param += struct.pack("<Bii", servo_id, int(profile_acceleration), int(profile_velocity))
+        dxl_comm_result = self.packetHandler.syncWriteTxOnly(self.portHandler, self.ADDR_MX_PROFILE_ACCELERATION, 8, param, len(param))
+        if dxl_comm_result != self.COMM_SUCCESS:
+            raise Exception("Error occurred while setting the motion profile")
+
+    def step_goal_position_with_profile(self, pan_goal, tilt_goal, tolerance=10):
+        """
+        Profile-mode counterpart of step_goal_position_with_pid: a new goal is written once and
+        the servos' own motion profile carries out the move, later calls only read the position.
+        The goal is written again when the servos have made no progress toward it within
+        profile_resend_timeout seconds, as the write gets no status packet to confirm it.
+        Returns True once both axes are within tolerance.
+        """
+        if pan_goal is not None:
+            pan_goal = int(self.clamp_servo_position(pan_goal, self.PAN_MIN_POSITION, self.PAN_MAX_POSITION))
+        if tilt_goal is not None:
+            tilt_goal = int(self.clamp_servo_position(tilt_goal, self.TILT_MIN_POSITION, self.TILT_MAX_POSITION))
+
+        goal = (pan_goal, tilt_goal)
+        if goal != self._profile_goal:
+            if not self.set_goal_position(pan_goal, tilt_goal):
+                return False
+            self._profile_goal = goal
+            self._profile_goal_sent = (time.monotonic(), None)
+            return False
+
+        current_pan_position, current_tilt_position = self.get_present_position()
+        pan_distance = 0 if pan_goal is None else abs(pan_goal - current_pan_position)
+        tilt_distance = 0 if tilt_goal is None else abs(tilt_goal - current_tilt_position)
+        if pan_distance <= tolerance and tilt_distance <= tolerance:
+            return True
+
+        sent_at, last_distance = self._profile_goal_sent
+        distance = (pan_distance, tilt_distance)
+        if last_distance is None:
+            self._profile_goal_sent = (sent_at, distance)
+        elif time.monotonic() - sent_at >= self.profile_resend_timeout:
+            # Per axis, so a slow axis still closing in counts as progress
+            moving = any(now < last for now, last in zip(distance, last_distance) if now > tolerance)
+            if not moving:
+                # No axis got closer since the last check: the goal never arrived, write it again
+                self.set_goal_position(pan_goal, tilt_goal)
+            self._profile_goal_sent = (time.monotonic(), distance)
+        return False
+
     def set_goal_position_with_pid(self, pan_goal, tilt_goal):
         MAX_PAN_OUTPUT = 1000
         RAMP_RATE = 0.25
@@ -168,12 +258,11 @@ class DynamixelController:
                 # Apply the ramping mechanism
                 pan_output *= RAMP_RATE
 
-                print("Pan Error:", pan_error)
-                print("Pan Output:", pan_output)
+                log.debug("Pan Error: %s Pan Output: %s", pan_error, pan_output)
                 self.set_goal_position(int(current_pan_position - pan_output), None)
                 time.sleep(0.01)  # Sleep for 10ms to avoid excessive speed
                 current_pan_position, _ = self.get_present_position()  # Unpack only the pan position
-                print("Current Pan Position:", current_pan_position)
+                log.debug("Current Pan Position: %s", current_pan_position)
     
         if tilt_goal is not None:
             tilt_goal = self.clamp_servo_position(tilt_goal, self.TILT_MIN_POSITION, self.TILT_MAX_POSITION)
@@ -181,13 +270,50 @@ class DynamixelController:
             while abs(current_tilt_position - tilt_goal) > 10:
                 tilt_error = tilt_goal - current_tilt_position
                 tilt_output = self.tilt_pid.update(tilt_error)
-                print("Tilt Error:", tilt_error)
-                print("Tilt Output:", tilt_output)
+                log.debug("Tilt Error: %s Tilt Output: %s", tilt_error, tilt_output)
                 self.set_goal_position(None, int(current_tilt_position - tilt_output))
                 time.sleep(0.01)  # Sleep for 10ms to avoid excessive speed
                 _, current_tilt_position = self.get_present_position()  # Unpack only the tilt position
     
+    def step_goal_position_with_pid(self, pan_goal, tilt_goal, tolerance=10):
+        """
+        Run a single PID iteration for both axes at once and return True once both are within tolerance.
+        Unlike set_goal_position_with_pid this never sleeps, so the caller owns the loop timing.
+        """
+        MAX_PAN_OUTPUT = 1000
+        RAMP_RATE = 0.25
+
+        current_pan_position, current_tilt_position = self.get_present_position()
+        pan_step = None
+        tilt_step = None
+
+        if pan_goal is not None:
+            pan_goal = self.clamp_servo_position(pan_goal, self.PAN_MIN_POSITION, self.PAN_MAX_POSITION)
+            pan_error = pan_goal - current_pan_position
+            if abs(pan_error) > tolerance:
+                pan_output = self.pan_pid.update(pan_error)
+                pan_output = min(max(pan_output, -MAX_PAN_OUTPUT), MAX_PAN_OUTPUT) * RAMP_RATE
+                pan_step = int(current_pan_position - pan_output)
+
+        if tilt_goal is not None:
+            tilt_goal = self.clamp_servo_position(tilt_goal, self.TILT_MIN_POSITION, self.TILT_MAX_POSITION)
+            tilt_error = tilt_goal - current_tilt_position
+            if abs(tilt_error) > tolerance:
+                tilt_output = self.tilt_pid.update(tilt_error)
+                tilt_step = int(current_tilt_position - tilt_output)
+
+        if pan_step is None and tilt_step is None:
+            return True
+
+        # One sync write moves both axes together
+        self.set_goal_position(pan_step, tilt_step)
+        return False
+
     def get_present_position(self):
+        if self.telemetry_mode:
+            telemetry = self.read_telemetry()
+            return int(telemetry[0]["position"]), int(telemetry[1]["position"])
+
         # Syncread present position
         dxl_comm_result = self.groupSyncRead.txRxPacket()
         if dxl_comm_result != self.COMM_SUCCESS:
@@ -201,6 +327,22 @@ class DynamixelController:
     
         return int(pan_present_position), int(tilt_present_position)
 
+    def read_telemetry(self):
+        """
+        Read position, velocity, current and moving status of both servos in one sync read.
+        Returns self.telemetry, a TELEMETRY_DTYPE array (row 0 pan, row 1 tilt) that is
+        overwritten in place by the next read.
+        """
+        dxl_comm_result = self.groupTelemetryRead.txRxPacket()
+        if dxl_comm_result != self.COMM_SUCCESS:
+            raise Exception("Error occurred while reading telemetry")
+
+        # The SDK keeps each servo's status data as a byte list; copy both into the shared buffer
+        length = self.LEN_TELEMETRY
+        self._telemetry_buffer[:length] = self.groupTelemetryRead.data_dict[self.PAN_SERVO_ID]
+        self._telemetry_buffer[length:] = self.groupTelemetryRead.data_dict[self.TILT_SERVO_ID]
+        return self.telemetry
+
 
     def close(self):
         # Disable Dynamixel torque
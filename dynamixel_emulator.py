@@ -0,0 +1,460 @@
+# File: dynamixel_emulator.py
+
+import os
+import select
+import struct
+import threading
+import time
+import tty
+
+
+# Protocol 2.0 instructions
+INST_PING = 0x01
+INST_READ = 0x02
+INST_WRITE = 0x03
+INST_REG_WRITE = 0x04
+INST_ACTION = 0x05
+INST_REBOOT = 0x08
+INST_STATUS = 0x55
+INST_SYNC_READ = 0x82
+INST_SYNC_WRITE = 0x83
+INST_BULK_READ = 0x92
+INST_BULK_WRITE = 0x93
+
+BROADCAST_ID = 0xFE
+
+# Status packet error numbers
+ERRNUM_INSTRUCTION = 2
+ERRNUM_CRC = 3
+ERRNUM_DATA_LIMIT = 6
+ERRNUM_ACCESS = 7
+
+HEADER = b"\xff\xff\xfd\x00"
+
+
+def _build_crc_table():
+    table = []
+    for i in range(256):
+        crc = i << 8
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x8005) if crc & 0x8000 else (crc << 1)
+        table.append(crc & 0xFFFF)
+    return table
+
+
+CRC_TABLE = _build_crc_table()
+
+
+def update_crc(data, crc=0):
+    """CRC-16 (polynomial 0x8005) as used by Dynamixel Protocol 2.0."""
+    for byte in data:
+        crc = ((crc << 8) ^ CRC_TABLE[((crc >> 8) ^ byte) & 0xFF]) & 0xFFFF
+    return crc
+
+
+def add_stuffing(body):
+    """Insert 0xFD after every FF FF FD sequence in the instruction/parameter section."""
+    out = bytearray()
+    for byte in body:
+        out.append(byte)
+        if byte == 0xFD and len(out) >= 3 and out[-3] == 0xFF and out[-2] == 0xFF:
+            out.append(0xFD)
+    return out
+
+
+def remove_stuffing(body):
+    out = bytearray()
+    i = 0
+    while i < len(body):
+        out.append(body[i])
+        if body[i] == 0xFD and len(out) >= 3 and out[-3] == 0xFF and out[-2] == 0xFF and i + 1 < len(body) and body[i + 1] == 0xFD:
+            i += 1
+        i += 1
+    return out
+
+
+def build_packet(servo_id, instruction, params=b""):
+    body = add_stuffing(bytes([instruction]) + bytes(params))
+    packet = bytearray(HEADER) + bytes([servo_id]) + struct.pack("<H", len(body) + 2) + body
+    packet += struct.pack("<H", update_crc(packet))
+    return bytes(packet)
+
+
+class EmulatedServo:
+    """
+    Control table and position dynamics of a single MX-series (Protocol 2.0) servo.
+
+    The servo's own position loop is modelled as a first-order response with time
+    constant `tau`, limited by the no-load speed, and by Profile Velocity/Acceleration
+    when those registers are non-zero.
+    """
+
+    MODEL_NUMBER = 311  # MX-64(2.0)
+    FIRMWARE_VERSION = 45
+    CONTROL_TABLE_SIZE = 256
+    EEPROM_END = 64
+
+    # Control table addresses
+    ADDR_MODEL_NUMBER = 0
+    ADDR_FIRMWARE_VERSION = 6
+    ADDR_ID = 7
+    ADDR_BAUD_RATE = 8
+    ADDR_RETURN_DELAY_TIME = 9
+    ADDR_OPERATING_MODE = 11
+    ADDR_MAX_POSITION_LIMIT = 48
+    ADDR_MIN_POSITION_LIMIT = 52
+    ADDR_TORQUE_ENABLE = 64
+    ADDR_STATUS_RETURN_LEVEL = 68
+    ADDR_PROFILE_ACCELERATION = 108
+    ADDR_PROFILE_VELOCITY = 112
+    ADDR_GOAL_POSITION = 116
+    ADDR_MOVING = 122
+    ADDR_MOVING_STATUS = 123
+    ADDR_PRESENT_CURRENT = 126
+    ADDR_PRESENT_VELOCITY = 128
+    ADDR_PRESENT_POSITION = 132
+    READ_ONLY_START = 122
+    READ_ONLY_END = 147
+
+    POSITION_CONTROL_MODE = 3
+    EXT_POSITION_CONTROL_MODE = 4
+
+    TICKS_PER_REV = 4096
+    VELOCITY_UNIT_RPM = 0.229
+    ACCELERATION_UNIT_RPM2 = 214.577
+    CURRENT_PER_TICK_PER_S2 = 0.002  # Present Current units per tick/s^2 of acceleration
+    MOVING_THRESHOLD = 20  # Velocity units, same as the factory Moving Threshold
+
+    def __init__(self, servo_id, position=2048, operating_mode=EXT_POSITION_CONTROL_MODE,
+                 return_delay_time=250, max_velocity_rpm=63.0, tau=0.03):
+        self.servo_id = servo_id
+        self.max_velocity = max_velocity_rpm / 60.0 * self.TICKS_PER_REV  # ticks/s
+        self.tau = tau
+
+        self.table = bytearray(self.CONTROL_TABLE_SIZE)
+        self._put(self.ADDR_MODEL_NUMBER, 2, self.MODEL_NUMBER)
+        self._put(self.ADDR_FIRMWARE_VERSION, 1, self.FIRMWARE_VERSION)
+        self._put(self.ADDR_ID, 1, servo_id)
+        self._put(self.ADDR_BAUD_RATE, 1, 3)  # 1 Mbps
+        self._put(self.ADDR_RETURN_DELAY_TIME, 1, return_delay_time)
+        self._put(self.ADDR_OPERATING_MODE, 1, operating_mode)
+        self._put(self.ADDR_MAX_POSITION_LIMIT, 4, self.TICKS_PER_REV - 1)
+        self._put(self.ADDR_MIN_POSITION_LIMIT, 4, 0)
+        self._put(self.ADDR_STATUS_RETURN_LEVEL, 1, 2)
+        self._put(self.ADDR_GOAL_POSITION, 4, position)
+
+        self.position = float(position)
+        self.velocity = 0.0
+        self.acceleration = 0.0
+        self.last_update = time.monotonic()
+        self.registered = None
+        self._sync_present_registers()
+
+    def _put(self, address, length, value):
+        self.table[address:address + length] = int(value).to_bytes(length, "little", signed=value < 0)
+
+    def _get(self, address, length, signed=False):
+        return int.from_bytes(self.table[address:address + length], "little", signed=signed)
+
+    @property
+    def return_delay(self):
+        """Return Delay Time in seconds (register unit is 2 us)."""
+        return self._get(self.ADDR_RETURN_DELAY_TIME, 1) * 2e-6
+
+    @property
+    def status_return_level(self):
+        return self._get(self.ADDR_STATUS_RETURN_LEVEL, 1)
+
+    def update(self, now):
+        """Advance the position dynamics up to `now` (time.monotonic())."""
+        elapsed = now - self.last_update
+        self.last_update = now
+        if elapsed <= 0:
+            return
+
+        goal = self._get(self.ADDR_GOAL_POSITION, 4, signed=True)
+        torque = self._get(self.ADDR_TORQUE_ENABLE, 1)
+        profile_velocity = self._get(self.ADDR_PROFILE_VELOCITY, 4)
+        profile_acceleration = self._get(self.ADDR_PROFILE_ACCELERATION, 4)
+
+        velocity_limit = self.max_velocity
+        if profile_velocity:
+            velocity_limit = min(velocity_limit, profile_velocity * self.VELOCITY_UNIT_RPM / 60.0 * self.TICKS_PER_REV)
+        acceleration_limit = None
+        if profile_acceleration:
+            acceleration_limit = profile_acceleration * self.ACCELERATION_UNIT_RPM2 / 3600.0 * self.TICKS_PER_REV
+
+        if not torque:
+            goal = self.position
+
+        # Integrate in 1 ms sub-steps; skip the work entirely once settled
+        step = 0.001
+        while elapsed > 0:
+            dt = min(step, elapsed)
+            elapsed -= dt
+            error = goal - self.position
+            if abs(error) < 0.5 and abs(self.velocity) < 1.0:
+                self.position = float(goal)
+                self.velocity = 0.0
+                self.acceleration = 0.0
+                break
+
+            limit = velocity_limit
+            if acceleration_limit:
+                limit = min(limit, (2.0 * acceleration_limit * abs(error)) ** 0.5)
+            desired = max(-limit, min(limit, error / self.tau))
+
+            delta = desired - self.velocity
+            if acceleration_limit:
+                delta = max(-acceleration_limit * dt, min(acceleration_limit * dt, delta))
+            self.acceleration = delta / dt
+            self.velocity += delta
+            self.position += self.velocity * dt
+
+        self._sync_present_registers()
+
+    def _sync_present_registers(self):
+        goal = self._get(self.ADDR_GOAL_POSITION, 4, signed=True)
+        velocity_units = int(self.velocity * 60.0 / self.TICKS_PER_REV / self.VELOCITY_UNIT_RPM)
+        moving = abs(velocity_units) > self.MOVING_THRESHOLD
+        in_position = abs(goal - self.position) <= 1
+
+        self._put(self.ADDR_PRESENT_POSITION, 4, int(round(self.position)))
+        self._put(self.ADDR_PRESENT_VELOCITY, 4, velocity_units)
+        self._put(self.ADDR_PRESENT_CURRENT, 2, max(-32768, min(32767, int(self.acceleration * self.CURRENT_PER_TICK_PER_S2))))
+        self._put(self.ADDR_MOVING, 1, int(moving))
+        self._put(self.ADDR_MOVING_STATUS, 1, int(in_position) | (int(moving) << 1))
+
+    def read(self, address, length):
+        if address + length > self.CONTROL_TABLE_SIZE:
+            return ERRNUM_ACCESS, b""
+        return 0, bytes(self.table[address:address + length])
+
+    def write(self, address, data):
+        if address + len(data) > self.CONTROL_TABLE_SIZE or (
+                address < self.READ_ONLY_END and address + len(data) > self.READ_ONLY_START):
+            return ERRNUM_ACCESS
+        if address < self.EEPROM_END and self._get(self.ADDR_TORQUE_ENABLE, 1):
+            # EEPROM is locked while torque is enabled
+            return ERRNUM_ACCESS
+        if address <= self.ADDR_GOAL_POSITION < address + len(data):
+            offset = self.ADDR_GOAL_POSITION - address
+            goal = int.from_bytes(data[offset:offset + 4], "little", signed=True)
+            if self._get(self.ADDR_OPERATING_MODE, 1) == self.POSITION_CONTROL_MODE and not (
+                    self._get(self.ADDR_MIN_POSITION_LIMIT, 4) <= goal <= self._get(self.ADDR_MAX_POSITION_LIMIT, 4)):
+                return ERRNUM_DATA_LIMIT
+        self.table[address:address + len(data)] = data
+        self._sync_present_registers()
+        return 0
+
+
+class DynamixelEmulator:
+    """
+    Emulates a Protocol 2.0 Dynamixel bus on a pseudo-terminal.
+
+    Point the regular PortHandler at `port_name`. Request and status packets are
+    delayed by their transfer time at `baudrate` (10 bits per byte) plus each servo's
+    Return Delay Time, so round-trip numbers are comparable to a real half-duplex bus.
+    """
+
+    def __init__(self, servo_ids=(1, 2), baudrate=1000000, model_timing=True, **servo_kwargs):
+        self.baudrate = baudrate
+        self.model_timing = model_timing
+        self.servos = {servo_id: EmulatedServo(servo_id, **servo_kwargs) for servo_id in servo_ids}
+
+        self.master_fd, self.slave_fd = os.openpty()
+        tty.setraw(self.slave_fd)
+        self.port_name = os.ttyname(self.slave_fd)
+
+        self._buffer = bytearray()
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._serve, name="DynamixelEmulator", daemon=True)
+        self.reset_stats()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        os.close(self.master_fd)
+        os.close(self.slave_fd)
+
+    def reset_stats(self):
+        self.stats = {"instruction_packets": 0, "status_packets": 0, "rx_bytes": 0, "tx_bytes": 0}
+
+    def servo(self, servo_id):
+        """Return the EmulatedServo for `servo_id` with its dynamics brought up to date."""
+        with self._lock:
+            servo = self.servos[servo_id]
+            servo.update(time.monotonic())
+            return servo
+
+    def _transfer_time(self, num_bytes):
+        return num_bytes * 10.0 / self.baudrate if self.model_timing else 0.0
+
+    @staticmethod
+    def _wait_until(deadline):
+        remaining = deadline - time.monotonic()
+        if remaining > 0.002:
+            time.sleep(remaining - 0.001)
+        while time.monotonic() < deadline:
+            pass
+
+    def _serve(self):
+        while not self._stop_event.is_set():
+            ready, _, _ = select.select([self.master_fd], [], [], 0.05)
+            if not ready:
+                continue
+            try:
+                data = os.read(self.master_fd, 4096)
+            except OSError:
+                break
+            received_at = time.monotonic()
+            self._buffer += data
+            for packet in self._extract_packets():
+                self._handle_packet(packet, received_at)
+
+    def _extract_packets(self):
+        while True:
+            start = self._buffer.find(HEADER)
+            if start < 0:
+                # Keep a possible partial header
+                del self._buffer[:max(0, len(self._buffer) - 3)]
+                return
+            del self._buffer[:start]
+            if len(self._buffer) < 7:
+                return
+            total_length = 7 + struct.unpack_from("<H", self._buffer, 5)[0]
+            if len(self._buffer) < total_length:
+                return
+            packet = bytes(self._buffer[:total_length])
+            del self._buffer[:total_length]
+            yield packet
+
+    def _handle_packet(self, packet, received_at):
+        self.stats["instruction_packets"] += 1
+        self.stats["rx_bytes"] += len(packet)
+
+        servo_id = packet[4]
+        crc_ok = struct.unpack_from("<H", packet, len(packet) - 2)[0] == update_crc(packet[:-2])
+        body = remove_stuffing(packet[7:-2])
+        instruction, params = body[0], bytes(body[1:])
+
+        with self._lock:
+            now = time.monotonic()
+            for servo in self.servos.values():
+                servo.update(now)
+            if not crc_ok:
+                responses = [(self.servos[servo_id], ERRNUM_CRC, b"")] if servo_id in self.servos else []
+            else:
+                responses = self._execute(servo_id, instruction, params)
+
+        # The request occupied the wire before any servo could start answering
+        send_at = received_at + self._transfer_time(len(packet))
+        for servo, error, data in responses:
+            reply = build_packet(servo.servo_id, INST_STATUS, bytes([error]) + data)
+            send_at += servo.return_delay + self._transfer_time(len(reply))
+            if self.model_timing:
+                self._wait_until(send_at)
+            os.write(self.master_fd, reply)
+            self.stats["status_packets"] += 1
+            self.stats["tx_bytes"] += len(reply)
+
+    def _execute(self, servo_id, instruction, params):
+        """Apply an instruction and return the list of (servo, error, data) status replies."""
+        if instruction == INST_SYNC_READ:
+            address, length = struct.unpack_from("<HH", params)
+            return [(self.servos[i], *self.servos[i].read(address, length)) for i in params[4:] if i in self.servos]
+
+        if instruction == INST_BULK_READ:
+            responses = []
+            for offset in range(0, len(params), 5):
+                i, address, length = struct.unpack_from("<BHH", params, offset)
+                if i in self.servos:
+                    responses.append((self.servos[i], *self.servos[i].read(address, length)))
+            return responses
+
+        if instruction == INST_SYNC_WRITE:
+            address, length = struct.unpack_from("<HH", params)
+            for offset in range(4, len(params), length + 1):
+                i = params[offset]
+                if i in self.servos:
+                    self.servos[i].write(address, params[offset + 1:offset + 1 + length])
+            return []
+
+        if instruction == INST_BULK_WRITE:
+            offset = 0
+            while offset + 5 <= len(params):
+                i, address, length = struct.unpack_from("<BHH", params, offset)
+                if i in self.servos:
+                    self.servos[i].write(address, params[offset + 5:offset + 5 + length])
+                offset += 5 + length
+            return []
+
+        if instruction == INST_ACTION:
+            targets = self.servos.values() if servo_id == BROADCAST_ID else [self.servos.get(servo_id)]
+            for servo in targets:
+                if servo is not None and servo.registered is not None:
+                    servo.write(*servo.registered)
+                    servo.registered = None
+            return self._unicast_reply(servo_id, instruction, 0)
+
+        if servo_id == BROADCAST_ID:
+            if instruction == INST_PING:
+                return [(servo, 0, struct.pack("<HB", servo.MODEL_NUMBER, servo.FIRMWARE_VERSION))
+                        for servo in self.servos.values()]
+            for servo in self.servos.values():
+                if instruction == INST_WRITE:
+                    servo.write(struct.unpack_from("<H", params)[0], params[2:])
+            return []
+
+        servo = self.servos.get(servo_id)
+        if servo is None:
+            return []
+
+        if instruction == INST_PING:
+            return [(servo, 0, struct.pack("<HB", servo.MODEL_NUMBER, servo.FIRMWARE_VERSION))]
+        if instruction == INST_READ:
+            address, length = struct.unpack_from("<HH", params)
+            error, data = servo.read(address, length)
+            return self._unicast_reply(servo_id, instruction, error, data)
+        if instruction == INST_WRITE:
+            error = servo.write(struct.unpack_from("<H", params)[0], params[2:])
+            return self._unicast_reply(servo_id, instruction, error)
+        if instruction == INST_REG_WRITE:
+            servo.registered = (struct.unpack_from("<H", params)[0], params[2:])
+            return self._unicast_reply(servo_id, instruction, 0)
+        if instruction == INST_REBOOT:
+            return self._unicast_reply(servo_id, instruction, 0)
+        return self._unicast_reply(servo_id, instruction, ERRNUM_INSTRUCTION)
+
+    def _unicast_reply(self, servo_id, instruction, error, data=b""):
+        servo = self.servos.get(servo_id)
+        if servo is None:
+            return []
+        # Status Return Level: 0 = PING only, 1 = PING and READ, 2 = all instructions
+        level = servo.status_return_level
+        if level == 0 or (level == 1 and instruction != INST_READ):
+            return []
+        return [(servo, error, data)]
+
+
+if __name__ == "__main__":
+    with DynamixelEmulator() as emulator:
+        print(f"Emulating Dynamixel IDs {sorted(emulator.servos)} on {emulator.port_name}", flush=True)
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
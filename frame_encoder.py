@@ -0,0 +1,82 @@
+# File: frame_encoder.py
+
+import collections
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import stream_protocol
+from detections import to_pixels
+from logger import log
+
+
+def encode_frame(frame, boxes=None, scale=1.0, quality=90, raw=False):
+    """
+    Downscale, draw the normalized `boxes` (if any) and JPEG-encode one frame. Returns
+    (payload, payload_type, quality, width, height, seconds spent).
+    """
+    start = time.perf_counter()
+    picture = frame
+    if scale < 1.0:
+        picture = cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    if boxes is not None and len(boxes):
+        if picture is frame:
+            picture = frame.copy()  # The caller's frame stays clean
+        for bbox in to_pixels(boxes, picture.shape[1], picture.shape[0]).tolist():
+            cv2.rectangle(picture, (bbox[0], bbox[1]), (bbox[2], bbox[3]), (0, 255, 0), 2)
+
+    if raw:
+        payload, payload_type, quality = picture, stream_protocol.PAYLOAD_RAW_BGR, 0
+    else:
+        ret, payload = cv2.imencode('.jpg', picture, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        if not ret:
+            raise Exception("JPEG encoding failed")
+        payload_type = stream_protocol.PAYLOAD_JPEG
+    return payload, payload_type, quality, picture.shape[1], picture.shape[0], time.perf_counter() - start
+
+
+class FrameEncoderPool:
+    """
+    Runs frame encoding on worker threads (OpenCV releases the GIL while resizing and
+    encoding) so the camera loop is not capped by one core's JPEG speed.
+
+    Jobs are queued with a sequence number and handed to `on_ready(seq, item, result)`
+    strictly in submission order, from the worker thread that finishes the job at the head
+    of the queue, so nothing waits for the camera loop to collect them. A failed job is
+    logged and skipped. At most `max_in_flight` jobs are queued: check full() before
+    submitting and skip the frame instead of waiting.
+    """
+
+    def __init__(self, on_ready, workers=2, max_in_flight=None):
+        self.on_ready = on_ready
+        self.workers = workers
+        self.max_in_flight = max_in_flight if max_in_flight is not None else 2 * workers
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="FrameEncoder")
+        self.pending = collections.deque()  # (seq, item, future)
+        self._lock = threading.Lock()
+
+    def full(self):
+        return len(self.pending) >= self.max_in_flight
+
+    def submit(self, seq, item, function, *args, **kwargs):
+        """Queue `function(*args, **kwargs)`; `item` is handed back with its result."""
+        with self._lock:
+            future = self.executor.submit(function, *args, **kwargs)
+            self.pending.append((seq, item, future))
+        future.add_done_callback(self._release)
+
+    def _release(self, _):
+        # Whichever job finishes, hand over every finished job at the head, in order
+        with self._lock:
+            while self.pending and self.pending[0][2].done():
+                seq, item, future = self.pending.popleft()
+                try:
+                    result = future.result()
+                except Exception as e:
+                    log.error("Encoding frame %s failed: %s", seq, e, every=1.0)
+                    continue
+                self.on_ready(seq, item, result)
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        self.pending.clear()
@@ -0,0 +1,144 @@
+# File: frame_source.py
+
+import json
+import time
+import cv2
+import detections as detection_array
+from tracing import tracer
+
+
+class FrameSource:
+    """
+    Anything that yields (frame, detections) tuples from run().
+    frame is a BGR image and detections a detections.DETECTION_DTYPE array (label, confidence and a
+    normalized [xmin, ymin, xmax, ymax] box per row).
+    last_timestamp is the capture time in seconds of the frame most recently yielded.
+    """
+
+    last_timestamp = None
+
+    def run(self):
+        raise NotImplementedError
+
+    def capture_latency(self, timestamp):
+        """Seconds from capturing the frame stamped `timestamp` until now, or None if the clock is not live."""
+        return None
+
+
+class ReplayFrameSource(FrameSource):
+    """
+    Replays a recorded session: a video file plus a JSON-lines sidecar with one entry per frame,
+    {"frame": index, "timestamp": seconds, "detections": [{"label", "confidence", "xmin", ...}]}.
+
+    mode "realtime" paces frames by the recorded timestamps, "fast" yields as quickly as
+    they can be decoded and "fixed" paces them at `fps`.
+    """
+
+    MODES = ("realtime", "fast", "fixed")
+
+    def __init__(self, video_path, detections_path, mode="realtime", fps=None, loop=False):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown replay mode {mode!r}, expected one of {self.MODES}")
+        if mode == "fixed" and not fps:
+            raise ValueError("Fixed-rate replay needs an fps")
+
+        self.video_path = video_path
+        self.detections_path = detections_path
+        self.mode = mode
+        self.fps = fps
+        self.loop = loop
+        self.records = self.load_detections(detections_path)
+        # Converted once up front so replay costs nothing per frame
+        self.detection_arrays = [detection_array.from_records(record.get("detections", [])) for record in self.records]
+        self.empty_detections = detection_array.from_records([])
+
+    @staticmethod
+    def load_detections(detections_path):
+        records = []
+        with open(detections_path, "r") as file:
+            for line in file:
+                line = line.strip()
+                if line:
+                    records.append(json.loads(line))
+        return records
+
+    def _frame_period(self, capture):
+        if self.mode == "fixed":
+            return 1.0 / self.fps
+        video_fps = capture.get(cv2.CAP_PROP_FPS)
+        return 1.0 / video_fps if video_fps > 0 else 1.0 / 30
+
+    def run(self):
+        while True:
+            capture = cv2.VideoCapture(self.video_path)
+            if not capture.isOpened():
+                raise Exception(f"Failed to open replay video {self.video_path}")
+
+            period = self._frame_period(capture)
+            start_wall = time.perf_counter()
+            start_stamp = None
+            index = 0
+
+            try:
+                while True:
+                    ret, frame = capture.read()
+                    if not ret:
+                        break
+
+                    record = self.records[index] if index < len(self.records) else {}
+                    detections = self.detection_arrays[index] if index < len(self.records) else self.empty_detections
+
+                    if self.mode != "fast":
+                        # Sleep until this frame's offset from the start of the session
+                        stamp = record.get("timestamp") if self.mode == "realtime" else None
+                        if stamp is not None:
+                            if start_stamp is None:
+                                start_stamp = stamp
+                            offset = stamp - start_stamp
+                        else:
+                            offset = index * period
+                        delay = start_wall + offset - time.perf_counter()
+                        if delay > 0:
+                            time.sleep(delay)
+
+                    stamp = record.get("timestamp")
+                    self.last_timestamp = stamp if stamp is not None else index * period
+                    tracer.next_frame()
+                    yield frame, detections
+                    index += 1
+            finally:
+                capture.release()
+
+            if not self.loop:
+                return
+
+
+class SessionRecorder:
+    """Writes frames and detections in the format ReplayFrameSource reads back."""
+
+    def __init__(self, video_path, detections_path, fps=30, fourcc="MJPG"):
+        self.video_path = video_path
+        self.fps = fps
+        self.fourcc = fourcc
+        self.writer = None
+        self.detections_file = open(detections_path, "w")
+        self.index = 0
+
+    def write(self, frame, detections, timestamp=None):
+        if self.writer is None:
+            height, width = frame.shape[:2]
+            self.writer = cv2.VideoWriter(self.video_path, cv2.VideoWriter_fourcc(*self.fourcc), self.fps, (width, height))
+        self.writer.write(frame)
+
+        record = {
+            "frame": self.index,
+            "timestamp": time.time() if timestamp is None else timestamp,
+            "detections": detection_array.to_records(detections),
+        }
+        self.detections_file.write(json.dumps(record) + "\n")
+        self.index += 1
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.release()
+        self.detections_file.close()
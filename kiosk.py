@@ -2,15 +2,47 @@ import tkinter as tk
 from tkinter import messagebox, simpledialog, ttk
 import json
 import os
+import queue
 import subprocess
-from dynamixel_controller import DynamixelController
+import threading
+from tuning_channel import TuningPublisher
+from tracker_daemon import ControlClient
+
+
+class ProcessOutputPump(threading.Thread):
+    """
+    Reads a child process's stdout line by line on its own thread into a bounded queue, so
+    the child never blocks on a full pipe and the Tk thread never blocks on readline(). When
+    the queue is full the oldest lines are dropped and counted.
+    """
+
+    def __init__(self, process, lines, name=None):
+        super().__init__(name=name or f"ProcessOutputPump-{process.pid}", daemon=True)
+        self.process = process
+        self.lines = lines
+        self.dropped = 0
+
+    def run(self):
+        for line in self.process.stdout:
+            line = line.rstrip()
+            if not line:
+                continue
+            while True:
+                try:
+                    self.lines.put_nowait(line)
+                    break
+                except queue.Full:
+                    try:
+                        self.lines.get_nowait()
+                        self.dropped += 1
+                    except queue.Empty:
+                        pass
+        self.process.stdout.close()
 
 
 class Kiosk(tk.Tk):
-    def __init__(self, application_instance, *args, **kwargs):
+    def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.application_instance = application_instance
-        self.dynamixel_controller = application_instance
         self.title('Kiosk Application')
         self.geometry('1024x768')  # Set the resolution
         self.attributes('-fullscreen', True)  # Start in fullscreen
@@ -20,7 +52,8 @@ class Kiosk(tk.Tk):
 
 
         # Exit button on the top-left corner
-        self.exit_button = tk.Button(self, text="X", command=self.destroy, bg="red", fg="white")
+        self.exit_button = tk.Button(self, text="X", command=self.on_close, bg="red", fg="white")
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
         self.exit_button.place(x=10, y=10, width=30, height=30)
         # Exit admin mode button
         self.exit_admin_button = tk.Button(self, text="X", command=self.exit_admin_mode, bg="red", fg="white")
@@ -32,11 +65,27 @@ class Kiosk(tk.Tk):
         self.hamburger_menu = tk.Menu(self, tearoff=0)
 
         self.bind("<Button-3>", self.show_hamburger_menu)
-        self.ps4_process = None
-        self.main_process = None
-
-        # Store process outputs in a buffer
-        self.output_buffer = []
+        # One resident tracker process keeps the camera and bus open; buttons only switch its mode.
+        # Mode requests go out from a worker thread, which keeps resending the latest one until
+        # the tracker answers, and the replies come back to the Tk thread through a queue
+        self.tracker_process = None
+        self.requested_mode = None
+        self.tracker_lock = threading.Lock()
+        self.tracker_wake = threading.Event()
+        self.tracker_replies = queue.Queue()
+        self.tracker_thread = threading.Thread(target=self.control_tracker, name="TrackerControl", daemon=True)
+        self.tracker_thread.start()
+        # PID gains as last reported by the tracker, which owns the bus
+        self.pid_gains = {}
+        self.seed_pid_sliders = False
+
+        # The Text widget keeps the last output_lines lines of process output. Child output arrives
+        # through per-process reader threads and is drained in batches on the Tk thread
+        self.output_lines = 50
+        self.output_queue = queue.Queue(maxsize=1000)
+        self.output_pumps = []
+        self.output_batch = 200
+        self.output_interval_ms = 50
         self.stdout_frame = tk.Frame(self)
         self.stdout_frame.place(x=50, y=500, width=924, height=140)  # Adjusted height to accommodate scrollbar
 
@@ -47,6 +96,13 @@ class Kiosk(tk.Tk):
         self.stdout_display.pack(fill=tk.BOTH, expand=1)
         
         self.scrollbar.config(command=self.stdout_display.yview)
+        self.after(self.output_interval_ms, self.update_stdout_display)
+        self.after(self.output_interval_ms, self.poll_tracker_replies)
+
+        # Slider changes reach the running tracker over a local socket, coalesced and debounced
+        self.tuning = TuningPublisher()
+        self.tuning_interval_ms = 10
+        self.after(self.tuning_interval_ms, self.publish_tuning)
 
        # Add the Pan PIDs frame and sliders
         self.pan_pids_frame = ttk.LabelFrame(self, text="Pan PIDs", padding=(10, 5))
@@ -61,8 +117,6 @@ class Kiosk(tk.Tk):
         self.tilt_kp_slider = tk.Scale(self.tilt_pids_frame, from_=0, to_=10, resolution=0.1, orient=tk.HORIZONTAL, label="Kp", command=self.update_tilt_pid)
         self.tilt_ki_slider = tk.Scale(self.tilt_pids_frame, from_=0, to_=10, resolution=0.1, orient=tk.HORIZONTAL, label="Ki", command=self.update_tilt_pid)
         self.tilt_kd_slider = tk.Scale(self.tilt_pids_frame, from_=0, to_=10, resolution=0.1, orient=tk.HORIZONTAL, label="Kd", command=self.update_tilt_pid)
-        # Initialize the dynamixel controller
-        self.dynamixel_controller = DynamixelController("/dev/ttyUSB0", 1000000, 1, 2)  # Adjust parameters if needed
 
         self.skin_folder = "./skins"
         self.current_skin = "default_skin.json"
@@ -89,17 +143,6 @@ class Kiosk(tk.Tk):
         self.tilt_ki_slider.pack(fill=tk.BOTH, expand=True)
         self.tilt_kd_slider.pack(fill=tk.BOTH, expand=True)
 
-    def track_clicked(self):
-        # Set the slider values to the current PID values before starting tracking
-        self.pan_kp_slider.set(self.dynamixel_controller.pan_pid.kp)
-        self.pan_ki_slider.set(self.dynamixel_controller.pan_pid.ki)
-        self.pan_kd_slider.set(self.dynamixel_controller.pan_pid.kd)
-
-        self.tilt_kp_slider.set(self.dynamixel_controller.tilt_pid.kp)
-        self.tilt_ki_slider.set(self.dynamixel_controller.tilt_pid.ki)
-        self.tilt_kd_slider.set(self.dynamixel_controller.tilt_pid.kd)
-
-
     def save_to_output_txt(self):
         """Save the contents of the stdout_display Text widget to output.txt."""
         content = self.stdout_display.get(1.0, tk.END)
@@ -257,12 +300,17 @@ class Kiosk(tk.Tk):
         self.measurement_noise_cov_slider.pack(fill=tk.BOTH, expand=True)
 
     def update_process_noise_cov(self, event=None):
-        self.application_instance.process_noise_cov = float(self.process_noise_cov_slider.get())
-        self.application_instance.update_kalman_filter()
+        self.tuning.set(process_noise_cov=float(self.process_noise_cov_slider.get()))
 
     def update_measurement_noise_cov(self, event=None):
-        self.application_instance.measurement_noise_cov = float(self.measurement_noise_cov_slider.get())
-        self.application_instance.update_kalman_filter()
+        self.tuning.set(measurement_noise_cov=float(self.measurement_noise_cov_slider.get()))
+
+    def publish_tuning(self):
+        try:
+            self.tuning.poll()
+        except Exception as e:
+            print("Error in publish_tuning:", e)
+        self.after(self.tuning_interval_ms, self.publish_tuning)
 
     def show_hamburger_menu(self, event):
         self.hamburger_menu.post(event.x_root, event.y_root)
@@ -289,13 +337,13 @@ class Kiosk(tk.Tk):
 
     def display_pid_values(self):
         # Fetch the current PID values
-        pan_kp = self.dynamixel_controller.pan_pid.kp
-        pan_ki = self.dynamixel_controller.pan_pid.ki
-        pan_kd = self.dynamixel_controller.pan_pid.kd
+        pan_kp = self.pid_gains.get("pan_kp")
+        pan_ki = self.pid_gains.get("pan_ki")
+        pan_kd = self.pid_gains.get("pan_kd")
     
-        tilt_kp = self.dynamixel_controller.tilt_pid.kp
-        tilt_ki = self.dynamixel_controller.tilt_pid.ki
-        tilt_kd = self.dynamixel_controller.tilt_pid.kd
+        tilt_kp = self.pid_gains.get("tilt_kp")
+        tilt_ki = self.pid_gains.get("tilt_ki")
+        tilt_kd = self.pid_gains.get("tilt_kd")
     
         # Prepare the message string
         message = f"Pan PID Values: Kp={pan_kp}, Ki={pan_ki}, Kd={pan_kd}\n"
@@ -306,12 +354,19 @@ class Kiosk(tk.Tk):
 
     def append_to_stdout(self, line):
         """Append a line of text to the Text widget and ensure only the last 50 lines are visible."""
-        self.output_buffer.append(line)
-        while len(self.output_buffer) > 50:  # Keep only the last 50 lines
-            self.output_buffer.pop(0)
+        self.append_lines_to_stdout([line])
+
+    def append_lines_to_stdout(self, lines):
+        """Append lines to the Text widget in one edit, trimming it to the last output_lines lines."""
+        new_lines = [part for line in lines for part in str(line).splitlines()]
+        if not new_lines:
+            return
         self.stdout_display.config(state=tk.NORMAL)
-        self.stdout_display.delete(1.0, tk.END)
-        self.stdout_display.insert(tk.END, '\n'.join(self.output_buffer))
+        self.stdout_display.insert(tk.END, '\n'.join(new_lines) + '\n')
+        # The widget holds its lines plus the empty one after the last newline
+        excess = int(self.stdout_display.index('end-1c').split('.')[0]) - 1 - self.output_lines
+        if excess > 0:
+            self.stdout_display.delete(1.0, f"{excess + 1}.0")
         self.stdout_display.config(state=tk.DISABLED)
         self.stdout_display.yview(tk.END)  # Automatically scroll to the end
 
@@ -319,63 +374,140 @@ class Kiosk(tk.Tk):
         kp = self.pan_kp_slider.get()
         ki = self.pan_ki_slider.get()
         kd = self.pan_kd_slider.get()
-        self.dynamixel_controller.pan_pid.set_parameters(kp, ki, kd)
+        self.pid_gains.update(pan_kp=kp, pan_ki=ki, pan_kd=kd)
+        self.tuning.set(pan_kp=kp, pan_ki=ki, pan_kd=kd)
         self.display_pid_values()
 
     def update_tilt_pid(self, event=None):
         kp = self.tilt_kp_slider.get()
         ki = self.tilt_ki_slider.get()
         kd = self.tilt_kd_slider.get()
-        self.dynamixel_controller.tilt_pid.set_parameters(kp, ki, kd)
+        self.pid_gains.update(tilt_kp=kp, tilt_ki=ki, tilt_kd=kd)
+        self.tuning.set(tilt_kp=kp, tilt_ki=ki, tilt_kd=kd)
         self.display_pid_values()
 
     def update_stdout_display(self):
+        """Drain up to output_batch queued lines from the children, then reschedule."""
         try:
-            if self.ps4_process and self.ps4_process.poll() is None:
-                line = self.ps4_process.stdout.readline().strip()
-                if line:
-                    self.append_to_stdout(line)
-            if self.main_process and self.main_process.poll() is None:
-                line = self.main_process.stdout.readline().strip()
-                if line:
-                    self.append_to_stdout(line)
-            self.after(100, self.update_stdout_display)
+            lines = []
+            while len(lines) < self.output_batch:
+                try:
+                    lines.append(self.output_queue.get_nowait())
+                except queue.Empty:
+                    break
+            self.append_lines_to_stdout(lines)
+            self.output_pumps = [pump for pump in self.output_pumps if pump.is_alive()]
         except Exception as e:
             print("Error in update_stdout_display:", e)
+        # A full batch means more is waiting, come back right away
+        self.after(0 if len(lines) == self.output_batch else self.output_interval_ms, self.update_stdout_display)
+
+    def pump_output(self, process):
+        pump = ProcessOutputPump(process, self.output_queue)
+        pump.start()
+        self.output_pumps.append(pump)
+
+    def set_tracker_mode(self, mode):
+        """
+        Switch the resident tracker to `mode`, starting it in that mode if it is not running.
+        Never waits: the request is handed to the control thread, and a newer request replaces
+        one the tracker has not answered yet.
+        """
+        if self.tracker_process is None or self.tracker_process.poll() is not None:
+            env = os.environ.copy()
+            env["PYTHONUNBUFFERED"] = "1"
+            self.tracker_process = subprocess.Popen(['python3', 'tracker_daemon.py', '--mode', mode], env=env, stdout=subprocess.PIPE,
+                                                    stderr=subprocess.STDOUT, bufsize=1, universal_newlines=True)
+            self.pump_output(self.tracker_process)
+        # Sent even to a tracker just started in this mode: its reply carries the PID gains
+        with self.tracker_lock:
+            self.requested_mode = mode
+            self.tracker_wake.set()
+
+    def control_tracker(self):
+        """Control thread: send the latest requested mode until the tracker answers it."""
+        control = ControlClient()  # Only used on this thread
+        waiting_for = None
+        while True:
+            self.tracker_wake.wait()
+            with self.tracker_lock:
+                mode, process = self.requested_mode, self.tracker_process
+                self.tracker_wake.clear()
+            if mode is None:
+                continue
+            if process is None or process.poll() is not None:
+                self.tracker_replies.put({"type": "error", "message": f"tracker exited before switching to {mode}"})
+                reply = None
+            else:
+                reply = control.set_mode(mode)
+                if reply is None:
+                    if waiting_for != mode:
+                        waiting_for = mode
+                        self.tracker_replies.put({"type": "error", "message": "not answering yet, still trying"})
+                    self.tracker_wake.set()
+                    continue
+                self.tracker_replies.put(reply)
+            waiting_for = None
+            with self.tracker_lock:
+                if self.requested_mode == mode:
+                    self.requested_mode = None
+
+    def poll_tracker_replies(self):
+        """Handle the tracker's replies on the Tk thread, then reschedule."""
+        try:
+            while True:
+                try:
+                    reply = self.tracker_replies.get_nowait()
+                except queue.Empty:
+                    break
+                if reply.get("type") == "error":
+                    self.append_to_stdout(f"Tracker: {reply.get('message')}")
+                    continue
+                if isinstance(reply.get("gains"), dict):
+                    self.pid_gains.update(reply["gains"])
+                if self.seed_pid_sliders and reply.get("mode") == "track":
+                    self.seed_pid_sliders = False
+                    self.set_pid_sliders()
+        except Exception as e:
+            print("Error in poll_tracker_replies:", e)
+        self.after(self.output_interval_ms, self.poll_tracker_replies)
+
+    def set_pid_sliders(self):
+        for name, slider in (("pan_kp", self.pan_kp_slider), ("pan_ki", self.pan_ki_slider), ("pan_kd", self.pan_kd_slider),
+                             ("tilt_kp", self.tilt_kp_slider), ("tilt_ki", self.tilt_ki_slider), ("tilt_kd", self.tilt_kd_slider)):
+            if name in self.pid_gains:
+                slider.set(self.pid_gains[name])
 
     def ps4_clicked(self):
-        env = os.environ.copy()
-        env["PYTHONUNBUFFERED"] = "1"
-        if self.main_process and self.main_process.poll() is None:
-            self.main_process.terminate()
-        self.ps4_process = subprocess.Popen(['python3', 'ps4.py'], env=env, stdout=subprocess.PIPE,
-                                            stderr=subprocess.STDOUT, bufsize=1, universal_newlines=True)
-        self.update_stdout_display()
+        self.set_tracker_mode("joystick")
 
     def track_clicked(self):
-        env = os.environ.copy()
-        env["PYTHONUNBUFFERED"] = "1"
-        if self.ps4_process and self.ps4_process.poll() is None:
-            self.ps4_process.terminate()
-        self.main_process = subprocess.Popen(['python3', 'main.py'], env=env, stdout=subprocess.PIPE,
-                                             stderr=subprocess.STDOUT, bufsize=1, universal_newlines=True)
-        # Set the slider values to the current PID values before starting tracking
-        self.pan_kp_slider.set(self.dynamixel_controller.pan_pid.kp)
-        self.pan_ki_slider.set(self.dynamixel_controller.pan_pid.ki)
-        self.pan_kd_slider.set(self.dynamixel_controller.pan_pid.kd)
-    
-        self.tilt_kp_slider.set(self.dynamixel_controller.tilt_pid.kp)
-        self.tilt_ki_slider.set(self.dynamixel_controller.tilt_pid.ki)
-        self.tilt_kd_slider.set(self.dynamixel_controller.tilt_pid.kd)
-
-        self.update_stdout_display()
+        self.set_tracker_mode("track")
+        # Set the slider values to the tracker's PID values once it confirms tracking
+        self.seed_pid_sliders = True
+
+    def on_close(self):
+        """Shut the resident tracker down with the kiosk so it does not keep the bus and sockets."""
+        process = self.tracker_process
+        if process is not None and process.poll() is None:
+            control = ControlClient()
+            reply = control.shutdown()
+            control.close()
+            try:
+                process.wait(timeout=5 if reply is not None else 0)
+            except subprocess.TimeoutExpired:
+                # Not answering or not finishing: fall back to a signal
+                process.terminate()
+                try:
+                    process.wait(timeout=5)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+        self.tuning.close()
+        self.destroy()
 
     def stop_clicked(self):
-        if self.ps4_process and self.ps4_process.poll() is None:
-            self.ps4_process.terminate()
-    
-        if self.main_process and self.main_process.poll() is None:
-            self.main_process.terminate()
+        if self.tracker_process is not None and self.tracker_process.poll() is None:
+            self.set_tracker_mode("idle")
 
     def draw_title(self):
         custom_font = ('8-bit\ Arcade\ In.ttf', 48)
@@ -410,12 +542,8 @@ class Kiosk(tk.Tk):
 
 
 if __name__ == "__main__":
-    # Assuming you have imported the DynamixelController at the top of kiosk.py
-    # Instantiate the dynamixel controller first
-    dynamixel_controller = DynamixelController("/dev/ttyUSB0", 1000000, 1, 2)
-
-    # Now, instantiate the Kiosk app with the dynamixel controller
-    kiosk_app = Kiosk(dynamixel_controller)
+    # The tracker daemon owns the serial bus; the kiosk only talks to it over local sockets
+    kiosk_app = Kiosk()
     kiosk_app.mainloop()
 
 
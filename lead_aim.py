@@ -0,0 +1,93 @@
+# File: lead_aim.py
+
+import collections
+import numpy as np
+from coordinate_system import CoordinateSystem
+
+
+class LeadAimer:
+    """
+    Aims ahead of a moving target to make up for the pipeline latency.
+
+    The lead time is the measured capture-to-host latency plus the servo settle latency
+    (both smoothed), or a fixed `lead_horizon` in seconds when one is configured, capped at
+    `max_lead`. The target is projected forward along its estimated velocity with
+    CoordinateSystem.calculate_interception_point.
+
+    Every aim is checked once its lead time has passed: the aim point is compared with where
+    the target was actually measured, alongside the error an unled aim (the current position)
+    would have had. Both are kept as running averages in pixels.
+    """
+
+    def __init__(self, lead_horizon=None, max_lead=0.3, default_latency=0.1, smoothing=0.1):
+        self.lead_horizon = lead_horizon
+        self.max_lead = max_lead
+        self.default_latency = default_latency
+        self.smoothing = smoothing
+
+        self.capture_latency = None
+        self.servo_latency = None
+        self.lead_error = None
+        self.lag_error = None
+        self.evaluated = 0
+
+        self._target_id = None
+        self._pending = collections.deque(maxlen=256)
+
+    def _smooth(self, current, sample):
+        if current is None:
+            return sample
+        return current + self.smoothing * (sample - current)
+
+    def observe_latency(self, capture_latency=None, servo_latency=None):
+        """Fold in new latency measurements in seconds; None or out-of-range values are ignored."""
+        if capture_latency is not None and 0 <= capture_latency < 1.0:
+            self.capture_latency = self._smooth(self.capture_latency, capture_latency)
+        if servo_latency is not None and 0 <= servo_latency < 1.0:
+            self.servo_latency = servo_latency
+
+    @property
+    def latency(self):
+        """Measured end-to-end latency from capture to the servos arriving, in seconds."""
+        if self.capture_latency is None and self.servo_latency is None:
+            return self.default_latency
+        return (self.capture_latency or 0.0) + (self.servo_latency or 0.0)
+
+    @property
+    def lead_time(self):
+        lead = self.latency if self.lead_horizon is None else self.lead_horizon
+        return min(max(lead, 0.0), self.max_lead)
+
+    def _evaluate(self, position, timestamp):
+        while self._pending and self._pending[0][0] <= timestamp:
+            _, aimed, unled = self._pending.popleft()
+            self.lead_error = self._smooth(self.lead_error, float(np.hypot(*(aimed - position))))
+            self.lag_error = self._smooth(self.lag_error, float(np.hypot(*(unled - position))))
+            self.evaluated += 1
+
+    def aim(self, position, velocity, timestamp, target_id=None):
+        """
+        Return the point to aim at for a target at `position` moving at `velocity` (pixels and
+        pixels per second) in the frame captured at `timestamp` (seconds).
+        """
+        position = np.asarray(position, dtype=np.float64)
+        if target_id != self._target_id:
+            # Aims at a previous target say nothing about this one
+            self._pending.clear()
+            self._target_id = target_id
+        self._evaluate(position, timestamp)
+
+        lead = self.lead_time
+        aimed = np.array(CoordinateSystem.calculate_interception_point(position[0], position[1], velocity[0], velocity[1], lead))
+        self._pending.append((timestamp + lead, aimed, position.copy()))
+        return aimed
+
+    def stats(self):
+        return {
+            "lead_time": self.lead_time,
+            "capture_latency": self.capture_latency,
+            "servo_latency": self.servo_latency,
+            "lead_error_px": self.lead_error,
+            "lag_error_px": self.lag_error,
+            "evaluated": self.evaluated,
+        }
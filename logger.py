@@ -0,0 +1,139 @@
+# File: logger.py
+
+import atexit
+import collections
+import os
+import sys
+import threading
+import time
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+
+LEVEL_NAMES = {DEBUG: "DEBUG", INFO: "INFO", WARNING: "WARNING", ERROR: "ERROR"}
+
+
+class Logger:
+    """
+    Leveled logger that never blocks the caller.
+
+    Records below `level` are rejected with a single comparison and formatting is deferred
+    to a background writer thread, which drains a bounded queue and flushes once per batch.
+    Mutable arguments (NumPy arrays, lists, dicts) are copied when the record is queued, so
+    the line shows their values at the time of the call. When the queue is full new records
+    are dropped and counted. Passing `every=seconds` rate-limits a message, keyed on its
+    format string or on `key` when given (e.g. one key per tag ID).
+    """
+
+    def __init__(self, level=INFO, stream=None, queue_size=1024):
+        self.level = level
+        self.stream = stream if stream is not None else sys.stdout
+        self.queue_size = queue_size
+        self.dropped = 0
+        self.suppressed = 0
+
+        self._queue = collections.deque()
+        self._last_emitted = {}
+        self._wakeup = threading.Event()
+        self._writer = None
+        self._writer_lock = threading.Lock()
+        atexit.register(self.flush)
+
+    def set_level(self, level):
+        self.level = level
+
+    def is_enabled_for(self, level):
+        return level >= self.level
+
+    def debug(self, message, *args, every=None, key=None):
+        if DEBUG >= self.level:
+            self._log(DEBUG, message, args, every, key)
+
+    def info(self, message, *args, every=None, key=None):
+        if INFO >= self.level:
+            self._log(INFO, message, args, every, key)
+
+    def warning(self, message, *args, every=None, key=None):
+        if WARNING >= self.level:
+            self._log(WARNING, message, args, every, key)
+
+    def error(self, message, *args, every=None, key=None):
+        if ERROR >= self.level:
+            self._log(ERROR, message, args, every, key)
+
+    @staticmethod
+    def _snapshot(arg):
+        # Strings and scalars are immutable; arrays and containers may change before the writer runs
+        if isinstance(arg, (str, bytes)) or not hasattr(arg, "copy"):
+            return arg
+        return arg.copy()
+
+    def _log(self, level, message, args, every, key=None):
+        if every is not None:
+            key = message if key is None else key
+            now = time.monotonic()
+            last = self._last_emitted.get(key)
+            if last is not None and now - last < every:
+                self.suppressed += 1
+                return
+            self._last_emitted[key] = now
+
+        if len(self._queue) >= self.queue_size:
+            self.dropped += 1
+            return
+        self._queue.append((level, message, tuple(self._snapshot(arg) for arg in args)))
+
+        if self._writer is None:
+            self._start_writer()
+        self._wakeup.set()
+
+    def _start_writer(self):
+        with self._writer_lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_loop, name="LogWriter", daemon=True)
+                self._writer.start()
+
+    @staticmethod
+    def _format(level, message, args):
+        if args:
+            try:
+                message = message % args
+            except (TypeError, ValueError):
+                message = " ".join(str(part) for part in (message,) + args)
+        if level != INFO:
+            message = f"[{LEVEL_NAMES.get(level, level)}] {message}"
+        return message
+
+    def _drain(self):
+        lines = []
+        while self._queue:
+            try:
+                lines.append(self._format(*self._queue.popleft()))
+            except IndexError:
+                break
+        if lines:
+            self.stream.write("\n".join(lines) + "\n")
+            self.stream.flush()
+
+    def _write_loop(self):
+        while True:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            try:
+                self._drain()
+            except Exception:
+                # Never let a broken pipe take the writer thread down
+                pass
+
+    def flush(self):
+        """Write out everything queued so far from the calling thread."""
+        try:
+            self._drain()
+        except Exception:
+            pass
+
+
+# Shared process-wide logger, level from WINGMAN_LOG_LEVEL (DEBUG, INFO, WARNING or ERROR)
+log = Logger(level={name: level for level, name in LEVEL_NAMES.items()}.get(os.environ.get("WINGMAN_LOG_LEVEL", "INFO").upper(), INFO))
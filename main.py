@@ -1,23 +1,37 @@
 # File: main.py
 
+import os
 import time
+import argparse
 import threading
+import collections
 import cv2
 import users
 import numpy as np
 import apriltag
 import Jetson.GPIO as GPIO
 from dynamixel_controller import DynamixelController
+from servo_command_thread import ServoCommandThread
 from motion_tracker import MotionTracker
-from coordinate_system import CoordinateSystem
+from frame_source import ReplayFrameSource
+from tracing import tracer
+from logger import log
+from coordinate_system import CoordinateSystem, OrientationTransform
+from tag_search import TagSearch, TagSearchPool
+from multi_target_tracker import MultiTargetTracker, Measurement
+import detections as detection_array
+from lead_aim import LeadAimer
+from servo_calibration import ServoLookupTable
+from bus_optimizer import BusOptimizer
+from tuning_channel import TuningSubscriber, TUNING_ADDRESS
 
 def nothing(x):
     pass
 
 class Application:
-    def __init__(self):
+    def __init__(self, frame_source=None, device_port="/dev/ttyUSB0", trace_path=None, lead_horizon=None, calibration_path="servo_calibration.npz", motion_mode="pid", profile_velocity=0, profile_acceleration=1000, optimize_bus=False, bus_report=False, tuning_address=TUNING_ADDRESS, mode="track"):
         # Create settings window
-        self.device_port = "/dev/ttyUSB0"
+        self.device_port = device_port
         self.baudrate = 1000000 
         self.pan_servo_id = 1
         self.tilt_servo_id = 2
@@ -27,21 +41,45 @@ class Application:
 
         # Initialize components
         self.dynamixel_controller = DynamixelController(self.device_port, self.baudrate, self.pan_servo_id, self.tilt_servo_id)
-        self.motion_tracker = MotionTracker(self.nnPath)
+        # Report the bus latency settings and make them faster if allowed; the round trip is
+        # only measured when asked for or when settings are written
+        try:
+            report = BusOptimizer(self.dynamixel_controller, allow_writes=optimize_bus).optimize(measure=optimize_bus or bus_report)
+            print(BusOptimizer.format_report(report), flush=True)
+        except Exception as e:
+            print(f"Bus check failed: {e}", flush=True)
+        # "pid" steps the servos from the host, "profile" lets their firmware profile run each move
+        self.motion_mode = motion_mode
+        # Profile mode only beats host PID stepping with the servo's full speed and a steep ramp
+        self.profile_velocity = profile_velocity  # 0.229 rpm units, 0 is the servo's maximum
+        self.profile_acceleration = profile_acceleration  # 214.577 rev/min^2 units
+        self.servo_thread = ServoCommandThread(self.dynamixel_controller, mode=motion_mode)
+        # Any FrameSource works here; a ReplayFrameSource lets the loop run without the OAK device
+        self.motion_tracker = frame_source if frame_source is not None else MotionTracker(self.nnPath)
         self.coordinate_system = CoordinateSystem()
+        self.trace_path = trace_path
+        # Only "track" posts servo goals; tracker_daemon.py switches it while the loop runs
+        self.mode = mode
+        # Set by stop(), e.g. from tracker_daemon.py's control thread, to leave run() cleanly
+        self.stop_event = threading.Event()
 
-        # Initialize Kalman filter
-        self.kalman = cv2.KalmanFilter(4, 2)
-        self.kalman.measurementMatrix = np.array([[1, 0, 0, 0], [0, 1, 0, 0]], np.float32)
-        self.kalman.transitionMatrix = np.array([[1, 0, 1, 0], [0, 1, 0, 1], [0, 0, 1, 0], [0, 0, 0, 1]], np.float32)
+        # Track every person and tag with its own Kalman filter, in frame pixels and driven by the frame timestamps
         self.process_noise_cov = 6
         self.measurement_noise_cov = 4
-        self.kalman.processNoiseCov = np.eye(4, dtype=np.float32) * self.process_noise_cov
-        self.kalman.measurementNoiseCov = np.eye(2, dtype=np.float32) * self.measurement_noise_cov
-        self.kalman.statePost = np.zeros((4,1), np.float32)
-        self.kalman.statePre = np.zeros((4,1), np.float32)
-        self.kalman.errorCovPost = np.eye(4, dtype=np.float32)
-        self.kalman.errorCovPre = np.eye(4, dtype=np.float32)
+        self.target_tracker = MultiTargetTracker(self.process_noise_cov, self.measurement_noise_cov)
+        self.target_estimator = None  # Estimator of the track currently being followed
+
+        # PID gains and noise covariances tuned live from the kiosk, polled once per frame
+        self.tuning = TuningSubscriber(tuning_address) if tuning_address else None
+
+        # Aim where the target will be once the servos get there; lead_horizon None uses the measured latency
+        self.lead_aimer = LeadAimer(lead_horizon=lead_horizon)
+
+        # Pixel to servo lookup table from servo_calibration.py; without one the linear mapping is used
+        self.servo_table = None
+        if calibration_path and os.path.exists(calibration_path):
+            self.servo_table = ServoLookupTable.load(calibration_path)
+            print(f"Loaded servo calibration from {calibration_path}", flush=True)
 
 
         # Set home and detection timer
@@ -53,7 +91,11 @@ class Application:
         self.THRESHOLD_DISTANCE = 5
         self.TIME_LIMIT = 3.0
 
-        self.april_detector = apriltag.Detector()
+        # Tag search runs on worker threads, each with its own detector. It searches around the
+        # last prediction first and the full frame every 10 frames or after a miss
+        self.tag_pool = TagSearchPool(lambda: TagSearch(apriltag.Detector(), roi_size=160, roi_scale=1.0, full_frame_interval=10), workers=2, queue_size=4)
+        self.tag_pipeline_depth = 1  # Frames received ahead of the one being finished
+        self.tag_search_prediction = None
         self.april_tag_visible = False
         self.flip_horizontal = 1
         self.flip_vertical = 1
@@ -63,14 +105,38 @@ class Application:
         self.servo_speed = 200
         self.reverse_pan = 0
         self.reverse_tilt = 0
+        self.update_orientation()
         self.prev_x_pixels = None
         self.prev_y_pixels = None
         self.prev_vx_pixels = None
         self.prev_vy_pixels = None
 
+    def update_orientation(self):
+        """Rebuild the orientation transform after changing the flip or reverse settings."""
+        self.orientation = OrientationTransform(self.flip_horizontal, self.flip_vertical, self.reverse_pan, self.reverse_tilt)
+
     def update_kalman_filter(self):
-        self.kalman.processNoiseCov = np.eye(4, dtype=np.float32) * self.process_noise_cov
-        self.kalman.measurementNoiseCov = np.eye(2, dtype=np.float32) * self.measurement_noise_cov
+        # Only rebuilds the noise matrices when a tuning value actually changed
+        self.target_tracker.set_noise(self.process_noise_cov, self.measurement_noise_cov)
+
+    def apply_tuning(self):
+        """Take the newest kiosk tuning values, if any arrived, without blocking."""
+        values = self.tuning.poll() if self.tuning is not None else None
+        if not values:
+            return
+        # The servo thread swaps the gains in between two steps, so no step mixes old and new ones
+        gains = {}
+        for prefix, pid in (("pan", self.dynamixel_controller.pan_pid), ("tilt", self.dynamixel_controller.tilt_pid)):
+            if any(f"{prefix}_{name}" in values for name in ("kp", "ki", "kd")):
+                gains[f"{prefix}_gains"] = (values.get(f"{prefix}_kp", pid.kp), values.get(f"{prefix}_ki", pid.ki), values.get(f"{prefix}_kd", pid.kd))
+        self.servo_thread.set_pid_gains(**gains)
+        self.process_noise_cov = values.get("process_noise_cov", self.process_noise_cov)
+        self.measurement_noise_cov = values.get("measurement_noise_cov", self.measurement_noise_cov)
+        log.info("Tuning applied: %s", values)
+
+    def stop(self):
+        """Ask run() to finish after the current frame and release the bus."""
+        self.stop_event.set()
 
     def activate_relay(self, duration=2):
             GPIO.output(self.relay_pin, GPIO.HIGH)
@@ -87,14 +153,7 @@ class Application:
         return self.dynamixel_controller.clamp_servo_position(goal, min_position, max_position)
 
     def get_bbox_coordinates(self, detection):
-        return [detection.xmin, detection.ymin, detection.xmax, detection.ymax]
-
-    def update_kalman_filter(self, centroid):
-        self.kalman.processNoiseCov = np.eye(4, dtype=np.float32) * self.process_noise_cov
-        self.kalman.measurementNoiseCov = np.eye(2, dtype=np.float32) * self.measurement_noise_cov
-        centroid_array = np.array(centroid).astype(np.float32)
-        self.kalman.correct(centroid_array)
-        return self.kalman.predict()
+        return detection["box"].tolist()
 
     def draw_centroid(self, frame, centroid):
         centroid_px = (int(centroid[0] * frame.shape[1]), int(centroid[1] * frame.shape[0]))
@@ -134,16 +193,14 @@ class Application:
         thickness = 2  # Thickness of the circle outline
         cv2.circle(frame, center, radius, color, thickness)
 
-    def calculate_velocity(self, centroid):
-        if self.prev_x_pixels is not None and self.prev_y_pixels is not None:
-            velocity = self.coordinate_system.calculate_velocity(centroid[0], centroid[1], self.prev_x_pixels, self.prev_y_pixels, dt=2)
-            print(f"Calculated Velocity: {velocity}", flush=True)
-            return velocity
-        print("Returning None for velocity", flush=True)
-        return None, None
-
-    def calculate_centroid(self, detection):
-        return tuple(np.float32(val) for val in [(detection.xmax + detection.xmin) / 2, (detection.ymax + detection.ymin) / 2])
+    def calculate_velocity(self):
+        # Pixels per second from the estimator, which knows the real time between frames
+        if self.target_estimator is None or not self.target_estimator.initialized:
+            log.debug("Returning None for velocity")
+            return None, None
+        velocity = self.target_estimator.velocity
+        log.debug("Calculated Velocity: %s", velocity)
+        return velocity
 
     def is_authorized(self, frame, badge_id):
         # Check if badge ID exists in the database
@@ -178,27 +235,54 @@ class Application:
             print("Error: Home Position is not set", flush=True)
             return
 
+        if self.motion_mode == "profile":
+            self.dynamixel_controller.set_motion_profile(self.profile_velocity, self.profile_acceleration)
         self.dynamixel_controller.home_servos()
 
-        while True:
+        # From here on the servo thread owns the bus
+        self.servo_thread.start()
+
+        pending_frames = collections.deque()
+
+        while not self.stop_event.is_set():
 
             try:
                 for frame, detections in self.motion_tracker.run():
-                    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-                    tags = self.april_detector.detect(gray)
-
-                    # Filter detections based on confidence
-                    detections = [d for d in detections if d.confidence >= self.tag_confidence_threshold]
-        
-                    if self.flip_horizontal:
-                        frame = cv2.flip(frame, 1)
-                        for detection in detections:
-                            detection.xmin, detection.xmax = 1 - detection.xmin, 1 - detection.xmax
+                    if self.stop_event.is_set():
+                        break
+                    tag_seq = self.tag_pool.submit(frame, self.tag_search_prediction)
+
+                    # Filter detections based on confidence (a copy, so it outlives the source buffer)
+                    detections = detection_array.filter_confidence(detections, self.tag_confidence_threshold)
+
+                    # Finish the oldest frame once its tags are found, newer frames keep the workers busy
+                    pending_frames.append((tag_seq, frame, detections, self.motion_tracker.last_timestamp))
+                    if len(pending_frames) <= self.tag_pipeline_depth:
+                        continue
+                    tag_seq, frame, detections, frame_timestamp = pending_frames.popleft()
+                    tags = self.tag_pool.result(tag_seq) or []
+                    if frame_timestamp is None:
+                        frame_timestamp = time.monotonic()
+                    self.apply_tuning()
+                    self.update_kalman_filter()
         
-                    if self.flip_vertical:
-                        frame = cv2.flip(frame, 0)
-                        for detection in detections:
-                            detection.ymin, detection.ymax = 1 - detection.ymin, 1 - detection.ymax
+                    # Map detections into display/control space in one go; the pixels are only
+                    # flipped when the frame is going to be shown
+                    span_start = tracer.start()
+                    boxes = self.orientation.apply_boxes(detections["box"])
+                    if self.show_frame:
+                        frame = self.orientation.apply_frame(frame)
+                    tracer.stop("flip", span_start)
+
+                    # Associate person boxes and tags with persistent tracks
+                    span_start = tracer.start()
+                    width, height = frame.shape[1], frame.shape[0]
+                    tag_corners = [self.orientation.apply_points(tag.corners, width, height) for tag in tags]
+                    pixel_boxes = boxes * np.array([width, height, width, height], dtype=np.float32)
+                    measurements = [Measurement(box, confidence) for box, confidence in zip(pixel_boxes, detections["confidence"])]
+                    measurements += [Measurement(np.concatenate([c.min(axis=0), c.max(axis=0)]), 1.0, tag.tag_id, c) for tag, c in zip(tags, tag_corners)]
+                    self.target_tracker.update(measurements, frame_timestamp)
+                    tracer.stop("track_update", span_start)
         
                     if tags:
                         # There are AprilTags detected, so give them priority
@@ -206,15 +290,7 @@ class Application:
                     
                         # Track the first detected AprilTag
                         tag = tags[0]
-                        corners = tag.corners
-                    
-                        # Flip the corners horizontally if the image is flipped horizontally
-                        if self.flip_horizontal:
-                            corners[:, 0] = frame.shape[1] - corners[:, 0]
-                    
-                        # Flip the corners vertically if the image is flipped vertically
-                        if self.flip_vertical:
-                            corners[:, 1] = frame.shape[0] - corners[:, 1]
+                        corners = tag_corners[0]
                     
                         # Draw the bounding box
                         cv2.polylines(frame, [np.int32(corners)], isClosed=True, color=(0, 255, 0))
@@ -225,11 +301,8 @@ class Application:
 
                         self.is_authorized(frame, tag.tag_id)
 
-                        print(f"Badge Detected: {tag.tag_id}", flush=True)
-                        print(f"Type of centroid matrix: {centroid.dtype}", flush=True)
-                        print(f"Type of measurementMatrix: {self.kalman.measurementMatrix.dtype}", flush=True)
-                        print(f"Dimensions of measurementMatrix: {self.kalman.measurementMatrix.shape}", flush=True)
-                        print(f"Dimensions of centroid: {centroid.shape}", flush=True)
+                        log.info("Badge Detected: %s", tag.tag_id, every=1.0, key=("badge", tag.tag_id))
+                        log.debug("Tag centroid: %s", centroid)
                     
                         # Convert centroid to pixel coordinates
                         centroid_px = (int(centroid[0]), int(centroid[1]))
@@ -241,22 +314,24 @@ class Application:
                         # Draw a green dot on the centroid
                         cv2.circle(frame, centroid_px, 5, (0, 255, 0), -1)
                     
-                        # Update Kalman filter
-                        self.kalman.processNoiseCov = np.eye(4, dtype=np.float32) * self.process_noise_cov
-                        self.kalman.measurementNoiseCov = np.eye(2, dtype=np.float32) * self.measurement_noise_cov
-                    
-                        centroid = np.array([[np.float32(centroid_px[0])], [np.float32(centroid_px[1])]])
-
-                        self.kalman.correct(centroid)
+                        # The tag's track was already corrected by the tracker update
+                        centroid = np.array([centroid_px[0], centroid_px[1]], np.float32)
+                        self.target_estimator = self.target_tracker.track_for_tag(tag.tag_id).estimator
                     
-                        prediction = self.kalman.predict()
+                        # Where the tag should be on the next frame
+                        span_start = tracer.start()
+                        prediction = self.target_estimator.predict_ahead(self.target_estimator.nominal_dt)
+                        tracer.stop("kalman_predict", span_start)
                     
                         # Draw prediction
                         prediction_px = (int(prediction[0]), int(prediction[1]))
                         cv2.circle(frame, prediction_px, 5, (255, 0, 0), -1)
+
+                        # Next tag search looks around the prediction, in unflipped camera pixels
+                        self.tag_search_prediction = self.orientation.apply_points(prediction_px, frame.shape[1], frame.shape[0])
                     
                         # Calculate velocity
-                        vx, vy = self.calculate_velocity(centroid)
+                        vx, vy = self.calculate_velocity()
                         if vx is not None and vy is not None:
                             self.prev_vx_pixels, self.prev_vy_pixels = vx, vy
                         
@@ -265,57 +340,69 @@ class Application:
                         
                     else:
                         self.april_tag_visible = False
+                        self.tag_search_prediction = None
                         last_detection_timestamp = None
                         last_still_timestamp = None
                     
-                        # Predict using Kalman
-                        prediction = self.kalman.predict()
+                        # Stay on the current target while its track lives
+                        target = self.target_tracker.select_target()
+                        if target is not None:
+                            self.target_estimator = target.estimator
                     
-                        # If no detections, use the prediction
-                        if not detections:
-                            centroid = (prediction[0][0], prediction[1][0])
+                        # Target not seen this frame, show where its track predicts it
+                        if target is not None and target.misses:
+                            centroid = (target.position[0] / width, target.position[1] / height)
                             self.draw_blue_circle(frame, centroid)
                     
-                        # If detections are present
-                        elif detections:
-                            most_confident_detection = max(detections, key=lambda detection: detection.confidence)
-                            print(most_confident_detection)
+                        # Target seen this frame
+                        elif target is not None:
+                            log.debug("Target track %s: %s", target.track_id, target.box)
                     
-                            # Update timestamp and correct Kalman filter
+                            # Update timestamp
                             last_detection_timestamp = time.time()
-                            print(f"Last Detection Timestamp: {last_detection_timestamp}")
-                            centroid = self.calculate_centroid(most_confident_detection)
-                            print(f"centroid: {centroid}")
-                            centroid_measurement = np.array([[np.float32(centroid[0])], [np.float32(centroid[1])]])
-                            print(f"centroid measurement: {centroid_measurement}")
-                            self.kalman.correct(centroid_measurement)
-                            print(f"Kalman filter corrected with centroid measurement")
-
-                            pan_goal = self.coordinate_system.image_position_to_servo_goal(
-                             1 - centroid[0] if self.reverse_pan else centroid[0], 1,
-                             self.dynamixel_controller.PAN_MIN_POSITION,
-                             self.dynamixel_controller.PAN_MAX_POSITION
-                            ) * self.servo_scale
-                            print(f"First Pan Goal: {pan_goal}")
-                        
-                            tilt_goal = self.coordinate_system.image_position_to_servo_goal(
-                             1 - centroid[1] if self.reverse_tilt else centroid[1], 1,
-                             self.dynamixel_controller.TILT_MIN_POSITION,
-                             self.dynamixel_controller.TILT_MAX_POSITION
-                            ) * self.servo_scale
-                            print(f"First Tilt Goal: {tilt_goal}")
+                            log.debug("Last Detection Timestamp: %s", last_detection_timestamp)
+                            # Lead the target by the capture-to-servo latency
+                            span_start = tracer.start()
+                            self.lead_aimer.observe_latency(self.motion_tracker.capture_latency(frame_timestamp), self.servo_thread.settle_latency)
+                            aim_point = self.lead_aimer.aim(target.position, target.estimator.velocity, frame_timestamp, target.track_id)
+                            tracer.stop("lead_aim", span_start)
+                            self.draw_prediction(frame, aim_point)
+                            log.debug("Aim point: %s, lead %.3fs", aim_point, self.lead_aimer.lead_time)
+                            log.debug("Aiming error: %s px (unled %s px)", self.lead_aimer.lead_error, self.lead_aimer.lag_error, every=1.0)
+
+                            centroid = np.clip(aim_point / (width, height), 0.0, 1.0)
+                            log.debug("centroid: %s", centroid)
+
+                            servo_x, servo_y = self.orientation.servo_position(centroid)
+                            if self.servo_table is not None:
+                                # Calibrated lens-angle mapping; its measured center already includes the tilt offset
+                                pan_goal, tilt_goal = self.servo_table.lookup(servo_x, servo_y)
+                                tilt_trim = 0
+                            else:
+                                pan_goal = self.coordinate_system.image_position_to_servo_goal(
+                                 servo_x, 1,
+                                 self.dynamixel_controller.PAN_MIN_POSITION,
+                                 self.dynamixel_controller.PAN_MAX_POSITION
+                                ) * self.servo_scale
+
+                                tilt_goal = self.coordinate_system.image_position_to_servo_goal(
+                                 servo_y, 1,
+                                 self.dynamixel_controller.TILT_MIN_POSITION,
+                                 self.dynamixel_controller.TILT_MAX_POSITION
+                                ) * self.servo_scale
+                                tilt_trim = self.tilt_offset
+                            log.debug("First Pan Goal: %s", pan_goal)
+                            log.debug("First Tilt Goal: %s", tilt_goal)
 #                        
 #                            self.process_centroid(frame, centroid)
 #
-                            if pan_goal and tilt_goal:
+                            if pan_goal and tilt_goal and self.mode == "track":
                                 pan_goal = self.clamp_servo_position(pan_goal, self.dynamixel_controller.PAN_MIN_POSITION, self.dynamixel_controller.PAN_MAX_POSITION)
                                 tilt_goal = self.clamp_servo_position(tilt_goal, self.dynamixel_controller.TILT_MIN_POSITION, self.dynamixel_controller.TILT_MAX_POSITION)
                                 
-                                try:
-                                    self.dynamixel_controller.set_goal_position_with_pid(pan_goal, tilt_goal + self.tilt_offset)
-
-                                except Exception as e:
-                                    print(f"Error: The data value exceeds the limit value. {e}", flush=True)
+                                span_start = tracer.start()
+                                self.servo_thread.set_goal(pan_goal, tilt_goal + tilt_trim)
+                                tracer.stop("servo_goal", span_start)
 #
 #                            elapsed_time_since_detection = time.time() - last_detection_timestamp if last_detection_timestamp else float('inf')
 #                            elapsed_time_still = time.time() - last_still_timestamp if last_still_timestamp else float('inf')
@@ -325,6 +412,7 @@ class Application:
 #                                self.draw_centroid(frame, centroid)  # Green dot
 
                     # Display the frame
+                    span_start = tracer.start()
                     if self.show_frame:
                         cv2.imshow("Frame", frame)
                     else:
@@ -332,7 +420,9 @@ class Application:
                         pass
                   
                     # Break if 'q' is pressed
-                    if cv2.waitKey(1) == ord('q'):
+                    key = cv2.waitKey(1)
+                    tracer.stop("display", span_start)
+                    if key == ord('q'):
                         break
 
             except cv2.error as e:
@@ -345,16 +435,51 @@ class Application:
                 break
     
             except Exception as e:
-                print(f"An unexpected error occurred: {e}", flush=True)
+                log.error("An unexpected error occurred: %s", e, every=1.0)
                 # Decide what to do in case of a general error. You might want to continue, or you might want to break the loop:
                 continue
     
+        # Stop the servo thread before releasing the bus
+        self.servo_thread.stop()
+        self.tag_pool.stop()
+        if self.tuning is not None:
+            self.tuning.close()
+        print(f"Tag search stats: {self.tag_pool.stats()}", flush=True)
+        print(f"Lead aiming stats: {self.lead_aimer.stats()}", flush=True)
+
         # Close Dynamixel controller
         self.dynamixel_controller.close()
     
         # Destroy all OpenCV windows
         cv2.destroyAllWindows()
+
+        if self.trace_path:
+            tracer.dump(self.trace_path)
+            print(f"Trace written to {self.trace_path}", flush=True)
     
 if __name__ == "__main__":
-    app = Application()
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--replay', help="Recorded session video to use instead of the OAK camera")
+    parser.add_argument('--detections', help="JSON-lines detections sidecar for --replay")
+    parser.add_argument('--replay_mode', choices=ReplayFrameSource.MODES, default="realtime", help="Replay pacing")
+    parser.add_argument('--replay_fps', type=float, help="Frame rate for --replay_mode fixed")
+    parser.add_argument('--device_port', default="/dev/ttyUSB0", help="Dynamixel serial port (e.g. a dynamixel_emulator pty)")
+    parser.add_argument('--trace', help="Write per-stage spans as Chrome trace JSON to this file on exit")
+    parser.add_argument('--calibration', default="servo_calibration.npz", help="Pixel to servo lookup table written by servo_calibration.py")
+    parser.add_argument('--motion', choices=ServoCommandThread.MODES, default="pid", help="Host PID stepping or servo-side motion profiles")
+    parser.add_argument('--profile_velocity', type=int, default=0, help="Profile Velocity for --motion profile (0.229 rpm units, 0 is the servo's maximum)")
+    parser.add_argument('--profile_acceleration', type=int, default=1000, help="Profile Acceleration for --motion profile (214.577 rev/min^2 units)")
+    parser.add_argument('--optimize_bus', action="store_true", help="Lower Return Delay Time, Status Return Level and the USB latency timer at startup", default=False)
+    parser.add_argument('--bus_report', action="store_true", help="Measure the bus round trip at startup", default=False)
+    parser.add_argument('--lead_horizon', type=float, help="Fixed aiming lead in seconds (default: measured latency)")
+    parser.add_argument('--tuning_address', default=TUNING_ADDRESS, help="Socket the kiosk publishes live tuning on (empty to disable)")
+    args = parser.parse_args()
+
+    frame_source = None
+    if args.replay and not args.detections:
+        parser.error("--replay needs --detections")
+    if args.replay:
+        frame_source = ReplayFrameSource(args.replay, args.detections, mode=args.replay_mode, fps=args.replay_fps)
+
+    app = Application(frame_source=frame_source, device_port=args.device_port, trace_path=args.trace, lead_horizon=args.lead_horizon, calibration_path=args.calibration, motion_mode=args.motion, profile_velocity=args.profile_velocity, profile_acceleration=args.profile_acceleration, optimize_bus=args.optimize_bus, bus_report=args.bus_report, tuning_address=args.tuning_address)
     app.run()
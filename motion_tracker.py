@@ -1,11 +1,13 @@
 # File: motion_tracker.py
 
 import depthai as dai
-import numpy as np
 import time
 import cv2
+from frame_source import FrameSource
+from detections import DetectionBuffer
+from tracing import tracer
 
-class MotionTracker:
+class MotionTracker(FrameSource):
     def __init__(self, nnPath):
         # Define class constants
         self.SYNC_NN = True
@@ -53,6 +55,8 @@ class MotionTracker:
 
         self.detectionNetwork.out.link(self.nnOut.input)
 
+        # Detections are converted once per frame into preallocated structured arrays
+        self.detection_buffer = DetectionBuffer()
 
     def run(self):
         # Connect to device and start pipeline
@@ -62,17 +66,12 @@ class MotionTracker:
             qDet = device.getOutputQueue(name="nn", maxSize=4, blocking=False)
 
             frame = None
-            detections = []
+            detections = self.detection_buffer.fill([])
             counter = 0
             color2 = (255, 255, 255)
 
-            # nn data, being the bounding box locations, are in <0..1> range - they need to be normalized with frame width/height
-            def frameNorm(frame, bbox):
-                normVals = np.full(len(bbox), frame.shape[0])
-                normVals[::2] = frame.shape[1]
-                return (np.clip(np.array(bbox), 0, 1) * normVals).astype(int)
-
             while True:
+                receive_start = tracer.start()
                 if self.SYNC_NN:
                     inRgb = qRgb.get()
                     inDet = qDet.get()
@@ -82,14 +81,27 @@ class MotionTracker:
 
                 if inRgb is not None:
                     frame = inRgb.getCvFrame()
+                    # Device capture time, on the host-synchronized clock
+                    self.last_timestamp = inRgb.getTimestamp().total_seconds()
+                    tracer.next_frame()
+                    # Capture-to-host latency, the device timestamp is synced to the host clock
+                    received = tracer.start()
+                    latency_ns = int((dai.Clock.now() - inRgb.getTimestamp()).total_seconds() * 1e9)
+                    tracer.record("device_to_host", received - latency_ns, received)
                 
                 if inDet is not None:
-                    detections = inDet.detections
+                    detections = self.detection_buffer.fill(inDet.detections)
                     counter += 1
 
+                tracer.stop("host_receive", receive_start)
+
                 if frame is not None:
                     yield frame, detections
 
+    def capture_latency(self, timestamp):
+        # Frame timestamps are on the host-synchronized device clock
+        return dai.Clock.now().total_seconds() - timestamp
+
 if __name__ == "__main__":
     motion_tracker = MotionTracker('yolo-v4-tiny-tf_openvino_2021.4_6shave.blob')
     for frame, detections in motion_tracker.run():
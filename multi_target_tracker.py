@@ -0,0 +1,260 @@
+# File: multi_target_tracker.py
+
+import numpy as np
+from target_estimator import TargetStateEstimator
+
+
+def linear_sum_assignment(cost):
+    """
+    Minimum-cost assignment (Hungarian algorithm with potentials, O(n^2 m)).
+    Returns (rows, cols) index arrays like scipy.optimize.linear_sum_assignment.
+    """
+    cost = np.asarray(cost, dtype=np.float64)
+    if cost.size == 0:
+        return np.empty(0, dtype=int), np.empty(0, dtype=int)
+    transposed = cost.shape[0] > cost.shape[1]
+    if transposed:
+        cost = cost.T
+    n, m = cost.shape
+
+    # 1-indexed potentials and matching; column 0 is a virtual start column
+    u = np.zeros(n + 1)
+    v = np.zeros(m + 1)
+    match = np.zeros(m + 1, dtype=int)
+    way = np.zeros(m + 1, dtype=int)
+    for i in range(1, n + 1):
+        match[0] = i
+        j0 = 0
+        min_slack = np.full(m + 1, np.inf)
+        used = np.zeros(m + 1, dtype=bool)
+        while True:
+            used[j0] = True
+            i0 = match[j0]
+            free = ~used
+            free[0] = False
+            slack = cost[i0 - 1] - u[i0] - v[1:]
+            improved = free[1:] & (slack < min_slack[1:])
+            min_slack[1:][improved] = slack[improved]
+            way[1:][improved] = j0
+
+            candidates = np.where(free, min_slack, np.inf)
+            j1 = int(np.argmin(candidates))
+            delta = candidates[j1]
+
+            u[match[used]] += delta
+            v[used] -= delta
+            min_slack[free] -= delta
+            j0 = j1
+            if match[j0] == 0:
+                break
+        # Augment along the alternating path
+        while j0:
+            j1 = way[j0]
+            match[j0] = match[j1]
+            j0 = j1
+
+    cols = np.nonzero(match[1:])[0]
+    rows = match[1:][cols] - 1
+    if transposed:
+        rows, cols = cols, rows
+    order = np.argsort(rows)
+    return rows[order], cols[order]
+
+
+def box_iou(boxes_a, boxes_b):
+    """Pairwise IoU of (N, 4) and (M, 4) [xmin, ymin, xmax, ymax] arrays."""
+    boxes_a = np.asarray(boxes_a, dtype=np.float64).reshape(-1, 4)
+    boxes_b = np.asarray(boxes_b, dtype=np.float64).reshape(-1, 4)
+    top_left = np.maximum(boxes_a[:, None, :2], boxes_b[None, :, :2])
+    bottom_right = np.minimum(boxes_a[:, None, 2:], boxes_b[None, :, 2:])
+    intersection = np.prod(np.clip(bottom_right - top_left, 0, None), axis=2)
+    area_a = np.prod(boxes_a[:, 2:] - boxes_a[:, :2], axis=1)
+    area_b = np.prod(boxes_b[:, 2:] - boxes_b[:, :2], axis=1)
+    union = area_a[:, None] + area_b[None, :] - intersection
+    return np.where(union > 0, intersection / np.maximum(union, 1e-9), 0.0)
+
+
+class Measurement:
+    """One detection in display pixels: a YOLO person box or an AprilTag (with its corners)."""
+
+    __slots__ = ("box", "confidence", "tag_id", "corners")
+
+    def __init__(self, box, confidence=1.0, tag_id=None, corners=None):
+        self.box = np.asarray(box, dtype=np.float64)
+        self.confidence = confidence
+        self.tag_id = tag_id
+        self.corners = corners
+
+    @property
+    def center(self):
+        return (self.box[:2] + self.box[2:]) / 2
+
+
+class Track:
+    __slots__ = ("track_id", "tag_id", "estimator", "box", "confidence", "corners", "hits", "misses", "badge_id")
+
+    def __init__(self, track_id, measurement, timestamp, process_noise, measurement_noise):
+        self.track_id = track_id
+        self.tag_id = measurement.tag_id
+        self.estimator = TargetStateEstimator(process_noise, measurement_noise)
+        self.estimator.reset(measurement.center, timestamp)
+        self.box = measurement.box
+        self.confidence = measurement.confidence
+        self.corners = measurement.corners
+        self.hits = 1
+        self.misses = 0
+        self.badge_id = None  # AprilTag seen inside this person's box
+
+    @property
+    def is_tag(self):
+        return self.tag_id is not None
+
+    @property
+    def position(self):
+        return self.estimator.state[:2]
+
+    def predicted_box(self):
+        """Last box moved to the estimator's current position."""
+        half_size = (self.box[2:] - self.box[:2]) / 2
+        return np.concatenate([self.position - half_size, self.position + half_size])
+
+    def add(self, measurement):
+        self.estimator.correct(measurement.center)
+        self.box = measurement.box
+        self.confidence = measurement.confidence
+        self.corners = measurement.corners
+        self.hits += 1
+        self.misses = 0
+
+
+class MultiTargetTracker:
+    """
+    Keeps persistent track IDs for people (YOLO boxes) and AprilTags across frames.
+
+    Every frame all tracks are predicted to the frame timestamp, person boxes are matched to
+    person tracks by a minimum-cost assignment on 1 - IoU (falling back to center distance
+    when boxes do not overlap), and tags are matched by their tag ID. Unmatched detections
+    start new tracks, which count as confirmed after `min_hits` frames; confirmed tracks are
+    dropped after `max_misses` frames without a match, tentative ones on their first miss. select_target() stays on the current target
+    for as long as its track lives, so the turret only makes short moves.
+    """
+
+    GATE_COST = 1e6
+
+    def __init__(self, process_noise=6.0, measurement_noise=4.0, min_iou=0.1, max_distance=80.0, min_hits=2, max_misses=10):
+        self.process_noise = process_noise
+        self.measurement_noise = measurement_noise
+        self.min_iou = min_iou
+        self.max_distance = max_distance
+        self.min_hits = min_hits
+        self.max_misses = max_misses
+
+        self.tracks = []
+        self.target_id = None
+        self.last_target_position = None
+        self._next_id = 1
+
+    def set_noise(self, process_noise, measurement_noise):
+        self.process_noise = process_noise
+        self.measurement_noise = measurement_noise
+        for track in self.tracks:
+            track.estimator.set_noise(process_noise, measurement_noise)
+
+    def _cost_matrix(self, tracks, measurements):
+        track_boxes = np.array([track.predicted_box() for track in tracks])
+        measurement_boxes = np.array([m.box for m in measurements])
+        iou = box_iou(track_boxes, measurement_boxes)
+
+        track_centers = np.array([track.position for track in tracks])
+        measurement_centers = np.array([m.center for m in measurements])
+        distance = np.linalg.norm(track_centers[:, None, :] - measurement_centers[None, :, :], axis=2)
+
+        # Overlapping boxes cost 1 - IoU, disjoint but nearby boxes cost more than any overlap
+        cost = np.where(iou >= self.min_iou, 1.0 - iou, 1.0 + distance / self.max_distance)
+        cost[(iou < self.min_iou) & (distance > self.max_distance)] = self.GATE_COST
+        return cost
+
+    def _new_track(self, measurement, timestamp):
+        track = Track(self._next_id, measurement, timestamp, self.process_noise, self.measurement_noise)
+        self._next_id += 1
+        self.tracks.append(track)
+        return track
+
+    def update(self, measurements, timestamp=None):
+        """Advance all tracks to `timestamp` and fold in this frame's measurements."""
+        for track in self.tracks:
+            track.estimator.predict(timestamp)
+            track.misses += 1
+
+        people = [m for m in measurements if m.tag_id is None]
+        person_tracks = [track for track in self.tracks if not track.is_tag]
+        if people and person_tracks:
+            cost = self._cost_matrix(person_tracks, people)
+            rows, cols = linear_sum_assignment(cost)
+            matched = set()
+            for row, col in zip(rows, cols):
+                if cost[row, col] < self.GATE_COST:
+                    person_tracks[row].add(people[col])
+                    matched.add(col)
+            people = [m for i, m in enumerate(people) if i not in matched]
+        for measurement in people:
+            self._new_track(measurement, timestamp)
+
+        tag_tracks = {track.tag_id: track for track in self.tracks if track.is_tag}
+        for measurement in (m for m in measurements if m.tag_id is not None):
+            if measurement.tag_id in tag_tracks:
+                tag_tracks[measurement.tag_id].add(measurement)
+            else:
+                tag_tracks[measurement.tag_id] = self._new_track(measurement, timestamp)
+
+        # Tentative tracks get no grace period, so clutter cannot hold IDs or join the assignment
+        self.tracks = [track for track in self.tracks
+                       if track.misses <= (self.max_misses if track.hits >= self.min_hits else 0)]
+
+        # Remember which badge each visible person is wearing
+        for track in self.tracks:
+            if track.is_tag or track.misses:
+                continue
+            for tag_track in tag_tracks.values():
+                if tag_track.misses == 0:
+                    x, y = tag_track.position
+                    if track.box[0] <= x <= track.box[2] and track.box[1] <= y <= track.box[3]:
+                        track.badge_id = tag_track.tag_id
+        return self.tracks
+
+    def track_for_tag(self, tag_id):
+        for track in self.tracks:
+            if track.tag_id == tag_id:
+                return track
+        return None
+
+    def get(self, track_id):
+        for track in self.tracks:
+            if track.track_id == track_id:
+                return track
+        return None
+
+    def select_target(self):
+        """
+        Return the person track to aim at. The current target is kept while its track is
+        alive (coasting on its prediction through short dropouts); otherwise the visible
+        confirmed track nearest the current target's last position wins, then the most
+        confident one.
+        """
+        current = self.get(self.target_id)
+        if current is not None:
+            self.last_target_position = current.position.copy()
+            return current
+
+        self.target_id = None
+        candidates = [t for t in self.tracks if not t.is_tag and t.misses == 0 and t.hits >= self.min_hits]
+        if not candidates:
+            return None
+
+        if self.last_target_position is not None:
+            target = min(candidates, key=lambda t: np.linalg.norm(t.position - self.last_target_position))
+        else:
+            target = max(candidates, key=lambda t: t.confidence)
+        self.target_id = target.track_id
+        self.last_target_position = target.position.copy()
+        return target
@@ -0,0 +1,129 @@
+# File: servo_calibration.py
+
+import argparse
+import numpy as np
+from coordinate_system import CoordinateSystem
+
+# MX-64 position resolution: 4096 ticks per revolution
+TICKS_PER_DEGREE = 4096 / 360
+
+# OAK-D color camera as the trackers set it up: 1080P sensor mode, ISP scaled by 1/3 and the
+# whole ISP frame squeezed into the 416x416 preview (setPreviewKeepAspectRatio(False))
+CAMERA_HFOV_DEG = 68.8
+SENSOR_SIZE = (1920, 1080)
+ISP_SCALE = 1 / 3
+
+# A table covering less of the servo's travel than this across the image cannot aim at the
+# image edges; the optics or gearing it was built with are wrong
+MIN_SPAN_DEGREES = 20
+
+
+class ServoLookupTable:
+    """
+    Precomputed image position to servo goal mapping, one entry per pixel column and row.
+
+    Entries are the pinhole lens angles of each preview column and row, derived from the
+    camera's horizontal field of view, plus the servo position measured with the turret
+    aimed at the image center; lookups are plain array indexing.
+
+    Pan is taken from the x pixel and tilt from the y pixel only. That is exact along the
+    image center lines but an approximation elsewhere: on a pan-tilt mount the tilt angle
+    of an off-axis point also depends on x (roughly by cos(pan angle)), so towards the
+    image corners the tilt goal overshoots, by up to about 17% with the default optics.
+    """
+
+    def __init__(self, pan_table, tilt_table):
+        self.pan_table = np.asarray(pan_table, dtype=np.int32)
+        self.tilt_table = np.asarray(tilt_table, dtype=np.int32)
+        self.width = len(self.pan_table) - 1
+        self.height = len(self.tilt_table) - 1
+        self.validate()
+
+    def validate(self):
+        """Reject a table whose span across the image could not come from a real lens and mount."""
+        for axis, table in (("pan", self.pan_table), ("tilt", self.tilt_table)):
+            span = abs(int(table[-1]) - int(table[0])) / TICKS_PER_DEGREE
+            if not MIN_SPAN_DEGREES <= span <= 360:
+                raise Exception(f"Implausible servo calibration: the image spans {span:.1f} degrees of {axis} travel, "
+                                f"expected at least {MIN_SPAN_DEGREES}. Rebuild it with servo_calibration.py")
+
+    @classmethod
+    def build(cls, pan_center, tilt_center, width=CoordinateSystem.IMAGE_WIDTH_PIXELS, height=CoordinateSystem.IMAGE_HEIGHT_PIXELS,
+              pan_ticks_per_degree=TICKS_PER_DEGREE, tilt_ticks_per_degree=TICKS_PER_DEGREE,
+              hfov_deg=CAMERA_HFOV_DEG, sensor_size=SENSOR_SIZE, isp_scale=ISP_SCALE):
+        """
+        pan_center and tilt_center are the servo positions that aim at the image center.
+        The ticks per degree include any gearing between the servo and the turret. The
+        preview's focal length in pixels, per axis, follows from the horizontal field of
+        view of the sensor mode and the ISP output the preview is stretched from.
+        """
+        isp_width, isp_height = sensor_size[0] * isp_scale, sensor_size[1] * isp_scale
+        focal_isp = isp_width / 2 / np.tan(np.radians(hfov_deg) / 2)
+        focal_x = focal_isp * width / isp_width
+        focal_y = focal_isp * height / isp_height
+
+        # One entry per pixel edge, so both 0 and width (normalized 1.0) are covered
+        pan_angles = np.degrees(np.arctan((np.arange(width + 1) - width / 2) / focal_x))
+        tilt_angles = np.degrees(np.arctan((np.arange(height + 1) - height / 2) / focal_y))
+
+        pan_table = np.rint(pan_center + pan_angles * pan_ticks_per_degree)
+        tilt_table = np.rint(tilt_center + tilt_angles * tilt_ticks_per_degree)
+        return cls(pan_table, tilt_table)
+
+    def lookup(self, x, y):
+        """Servo goals for normalized image coordinates in [0, 1]."""
+        column = int(min(max(x, 0.0), 1.0) * self.width + 0.5)
+        row = int(min(max(y, 0.0), 1.0) * self.height + 0.5)
+        return int(self.pan_table[column]), int(self.tilt_table[row])
+
+    def save(self, path):
+        np.savez(path, pan_table=self.pan_table, tilt_table=self.tilt_table)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data["pan_table"], data["tilt_table"])
+
+
+def measure_center_offset(dynamixel_controller):
+    """
+    Let the turret be aimed at the image center by hand and return the servo positions.
+    Torque is switched off while aiming and left off.
+    """
+    dynamixel_controller.set_torque(dynamixel_controller.PAN_SERVO_ID, False)
+    dynamixel_controller.set_torque(dynamixel_controller.TILT_SERVO_ID, False)
+    input("Torque off. Aim the turret at an object in the center of the camera image, then press Enter...")
+    return dynamixel_controller.get_present_position()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the pixel to servo lookup table used by main.py")
+    parser.add_argument('--device_port', default="/dev/ttyUSB0", help="Dynamixel serial port")
+    parser.add_argument('--output', default="servo_calibration.npz", help="Where to save the lookup table")
+    parser.add_argument('--pan_center', type=int, help="Pan position aimed at the image center (skips measuring)")
+    parser.add_argument('--tilt_center', type=int, help="Tilt position aimed at the image center (skips measuring)")
+    parser.add_argument('--hfov', type=float, default=CAMERA_HFOV_DEG, help="Horizontal field of view of the camera's sensor mode in degrees")
+    parser.add_argument('--isp_scale', type=float, default=ISP_SCALE, help="ISP scale the preview is taken from, as in setIspScale")
+    parser.add_argument('--pan_gear_ratio', type=float, default=1.0, help="Servo turns per turret turn on the pan axis")
+    parser.add_argument('--tilt_gear_ratio', type=float, default=1.0, help="Servo turns per turret turn on the tilt axis")
+    args = parser.parse_args()
+
+    pan_center, tilt_center = args.pan_center, args.tilt_center
+    if pan_center is None or tilt_center is None:
+        from dynamixel_controller import DynamixelController
+        controller = DynamixelController(args.device_port, 1000000, 1, 2)
+        try:
+            measured_pan, measured_tilt = measure_center_offset(controller)
+        finally:
+            controller.portHandler.closePort()
+        pan_center = measured_pan if pan_center is None else pan_center
+        tilt_center = measured_tilt if tilt_center is None else tilt_center
+        print(f"Measured center position: pan {measured_pan}, tilt {measured_tilt}", flush=True)
+
+    table = ServoLookupTable.build(pan_center, tilt_center,
+                                   pan_ticks_per_degree=TICKS_PER_DEGREE * args.pan_gear_ratio,
+                                   tilt_ticks_per_degree=TICKS_PER_DEGREE * args.tilt_gear_ratio,
+                                   hfov_deg=args.hfov, isp_scale=args.isp_scale)
+    table.save(args.output)
+    print(f"Pan {table.pan_table[0]}..{table.pan_table[-1]}, tilt {table.tilt_table[0]}..{table.tilt_table[-1]}", flush=True)
+    print(f"Lookup table written to {args.output}", flush=True)
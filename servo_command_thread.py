@@ -0,0 +1,116 @@
+# File: servo_command_thread.py
+
+import threading
+import time
+from tracing import tracer
+from logger import log
+
+
+class ServoCommandThread(threading.Thread):
+    """
+    Owns the Dynamixel bus and drives pan and tilt towards the most recent goal.
+
+    Goals are posted into a single-slot mailbox with set_goal(); a newer goal simply
+    overwrites one that has not been picked up yet, so the vision loop never waits on
+    the servos and the servos never chase stale targets. settle_latency is a running
+    average of the time from posting a goal to the servos settling on it, in seconds
+    (None until the first goal has settled). Only goals that settle are sampled: a goal
+    replaced before it settles is dropped, its successor is timed from its own posting.
+    last_goal is the most recently posted goal.
+    """
+
+    MODES = ("pid", "profile")
+
+    def __init__(self, dynamixel_controller, period=0.01, tolerance=10, mode="pid"):
+        super().__init__(name="ServoCommandThread", daemon=True)
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown motion mode {mode!r}, expected one of {self.MODES}")
+        self.dynamixel_controller = dynamixel_controller
+        self.mode = mode
+        # "pid" steps intermediate goals from the host, "profile" sends one goal and lets the servo profile move
+        if mode == "profile":
+            self._step = dynamixel_controller.step_goal_position_with_profile
+        else:
+            self._step = dynamixel_controller.step_goal_position_with_pid
+        self.period = period
+        self.tolerance = tolerance
+        self.settle_latency = None
+        self.settle_smoothing = 0.2
+        self.last_goal = None
+
+        self._mailbox = None
+        self._pending_gains = {}  # "pan"/"tilt" -> (kp, ki, kd) waiting to be applied
+        self._mailbox_condition = threading.Condition()
+        self.stop_event = threading.Event()
+
+    def set_goal(self, pan_goal, tilt_goal):
+        """Post a new pan/tilt goal, replacing any goal that has not been started yet."""
+        with self._mailbox_condition:
+            self.last_goal = (pan_goal, tilt_goal)
+            self._mailbox = ((pan_goal, tilt_goal), time.monotonic())
+            self._mailbox_condition.notify()
+
+    def set_pid_gains(self, pan_gains=None, tilt_gains=None):
+        """Hand over new (kp, ki, kd) gains; they are applied between steps, never halfway through one."""
+        with self._mailbox_condition:
+            if pan_gains is not None:
+                self._pending_gains["pan"] = pan_gains
+            if tilt_gains is not None:
+                self._pending_gains["tilt"] = tilt_gains
+            # Wake an idle thread so the gains are in place even when no goal follows
+            self._mailbox_condition.notify()
+
+    def _apply_gains(self):
+        with self._mailbox_condition:
+            gains, self._pending_gains = self._pending_gains, {}
+        for axis, (kp, ki, kd) in gains.items():
+            pid = self.dynamixel_controller.pan_pid if axis == "pan" else self.dynamixel_controller.tilt_pid
+            pid.set_parameters(kp, ki, kd)
+
+    def _take_goal(self, block):
+        with self._mailbox_condition:
+            if block and self._mailbox is None and not self._pending_gains and not self.stop_event.is_set():
+                self._mailbox_condition.wait()
+            goal, self._mailbox = self._mailbox, None
+            return goal
+
+    def run(self):
+        active_goal = None
+        posted = None
+        while not self.stop_event.is_set():
+            # Sleep on the mailbox while idle, otherwise just check it between steps
+            new_goal = self._take_goal(block=active_goal is None)
+            if self._pending_gains:
+                self._apply_gains()
+            if new_goal is not None:
+                active_goal, posted = new_goal
+            if active_goal is None:
+                continue
+
+            try:
+                write_start = tracer.start()
+                settled = self._step(*active_goal, tolerance=self.tolerance)
+                tracer.stop("servo_write", write_start)
+            except Exception as e:
+                log.error("Servo command failed: %s", e, every=1.0)
+                active_goal = None
+                continue
+
+            if settled:
+                self._record_settle_latency(time.monotonic() - posted)
+                active_goal = None
+            else:
+                self.stop_event.wait(self.period)
+
+    def _record_settle_latency(self, latency):
+        if self.settle_latency is None:
+            self.settle_latency = latency
+        else:
+            self.settle_latency += self.settle_smoothing * (latency - self.settle_latency)
+
+    def stop(self):
+        self.stop_event.set()
+        with self._mailbox_condition:
+            self._mailbox_condition.notify()
+        if self.is_alive():
+            self.join()
@@ -0,0 +1,230 @@
+# File: stream_client.py
+
+import argparse
+import collections
+import time
+import cv2
+import numpy as np
+import zmq
+import zmq.asyncio
+import stream_protocol
+from detections import DETECTION_DTYPE
+from time_sync import ClockSync, ClockSyncThread
+
+
+class StreamMessage:
+    """
+    One decoded message. detections and raw frames are views into the client's reusable
+    buffers and are overwritten by the next receive; copy them to keep them. JPEG frames
+    are new arrays.
+    """
+
+    __slots__ = ("header", "detections", "frame", "received_at", "latency", "capture_latency", "dropped_before")
+
+    def __init__(self, header, detections, frame, received_at, latency, capture_latency, dropped_before):
+        self.header = header
+        self.detections = detections
+        self.frame = frame
+        self.received_at = received_at
+        self.latency = latency
+        self.capture_latency = capture_latency
+        self.dropped_before = dropped_before
+
+    @property
+    def seq(self):
+        return self.header.seq
+
+
+class StreamClient:
+    """
+    Subscriber for the zmq_motion_tracker.py stream.
+
+    Detections and raw frames are decoded into buffers that are allocated once and reused,
+    a DETECTION_DTYPE array and a frame array; JPEG frames are decoded by OpenCV into a new
+    array per message (cv2.imdecode has no destination argument in Python). Every message
+    carries its transport latency (receive time minus the server's send time) and capture
+    latency, corrected by the server clock offset that sync_time() or a start_time_sync()
+    background thread estimates. Gaps in the sequence numbers of the detections messages are
+    counted as drops; picture messages repeat a seq and come later. frames_only subscribes
+    to picture messages alone, which suits conflate, and counts gaps in their picture_seq.
+
+    Iterate over the client for a blocking stream of messages; AsyncStreamClient offers the
+    same with asyncio.
+    """
+
+    def __init__(self, address="tcp://localhost:5555", time_sync_address=None, decode_frames=True, hwm=2, conflate=False, context=None, frames_only=False):
+        self.address = address
+        self.time_sync_address = time_sync_address
+        self.decode_frames = decode_frames
+        # Time sync requests double as feedback to the publisher's quality control
+        self.clock = ClockSync(time_sync_address, report=self.feedback) if time_sync_address else None
+        self._clock_thread = None
+
+        self.frames_only = frames_only
+        self.received = 0
+        self.sequenced = 0  # Messages checked for gaps: detections, or pictures with frames_only
+        self.dropped = 0
+        self.latencies = collections.deque(maxlen=1000)
+        self.recent_drops = collections.deque(maxlen=100)
+        self._last_seq = None
+        self._detections = np.zeros(64, dtype=DETECTION_DTYPE)
+        self._frame = None
+
+        self.context = context if context is not None else self._make_context()
+        self.socket = self.context.socket(zmq.SUB)
+        self.socket.setsockopt(zmq.RCVHWM, hwm)
+        if conflate:
+            self.socket.setsockopt(zmq.CONFLATE, 1)
+        for prefix in (stream_protocol.frame_subscriptions() if frames_only else [b""]):
+            self.socket.setsockopt(zmq.SUBSCRIBE, prefix)
+        self.socket.connect(address)
+
+    @staticmethod
+    def _make_context():
+        return zmq.Context.instance()
+
+    @property
+    def clock_offset(self):
+        """Server clock minus local clock in seconds, 0 without time sync."""
+        return self.clock.offset_at() if self.clock is not None else 0.0
+
+    def sync_time(self, exchanges=8):
+        """Run one burst of time-sync exchanges now and return the clock offset."""
+        if self.clock is None:
+            raise Exception("No time_sync_address configured")
+        return self.clock.sync(exchanges)
+
+    def start_time_sync(self, interval=2.0):
+        """Keep the clock offset and drift up to date from a background thread."""
+        if self.clock is None:
+            raise Exception("No time_sync_address configured")
+        if self._clock_thread is None:
+            self._clock_thread = ClockSyncThread(self.clock, interval)
+            self._clock_thread.start()
+
+    def _detections_view(self, buffer, count):
+        if count > len(self._detections):
+            self._detections = np.zeros(max(count, 2 * len(self._detections)), dtype=DETECTION_DTYPE)
+        view = self._detections[:count]
+        view[:] = np.frombuffer(buffer, dtype=DETECTION_DTYPE, count=count)
+        return view
+
+    def _frame_view(self, header, buffer):
+        if header.payload_type == stream_protocol.PAYLOAD_RAW_BGR:
+            shape = (header.height, header.width, 3)
+            if self._frame is None or self._frame.shape != shape:
+                self._frame = np.empty(shape, dtype=np.uint8)
+            self._frame[:] = np.frombuffer(buffer, dtype=np.uint8).reshape(shape)
+            return self._frame
+        if header.payload_type == stream_protocol.PAYLOAD_JPEG:
+            return cv2.imdecode(np.frombuffer(buffer, dtype=np.uint8), cv2.IMREAD_COLOR)
+        return None
+
+    def _decode(self, parts, received_at):
+        if len(parts) == 1:
+            header_buffer, detections_buffer, payload = stream_protocol.split_single_part(parts[0].buffer)
+        else:
+            header_buffer, detections_buffer, payload = (part.buffer for part in parts)
+        header = stream_protocol.unpack_header(header_buffer)
+
+        dropped_before = 0
+        if (header.payload_type != stream_protocol.PAYLOAD_NONE) == self.frames_only:
+            seq, mask = (header.picture_seq, 0xFF) if self.frames_only else (header.seq, 0xFFFFFFFF)
+            if self._last_seq is not None:
+                dropped_before = max(0, ((seq - self._last_seq) & mask) - 1)
+            self._last_seq = seq
+            self.sequenced += 1
+            self.dropped += dropped_before
+            self.recent_drops.append(dropped_before)
+        self.received += 1
+
+        server_now = received_at + (self.clock.offset_at(received_at) if self.clock is not None else 0.0)
+        latency = server_now - header.send_timestamp
+        self.latencies.append(latency)
+
+        detections = self._detections_view(detections_buffer, header.count)
+        frame = self._frame_view(header, payload) if self.decode_frames else None
+        return StreamMessage(header, detections, frame, received_at, latency, server_now - header.capture_timestamp, dropped_before)
+
+    def receive(self, timeout=None):
+        """Next message, or None if nothing arrived within `timeout` seconds."""
+        if timeout is not None and not self.socket.poll(timeout * 1000):
+            return None
+        parts = self.socket.recv_multipart(copy=False)
+        return self._decode(parts, time.time())
+
+    def __iter__(self):
+        while True:
+            yield self.receive()
+
+    def stats(self):
+        latencies = np.array(self.latencies) * 1000 if self.latencies else np.zeros(1)
+        total = self.sequenced + self.dropped
+        return {
+            "received": self.received,
+            "dropped": self.dropped,
+            "drop_rate": self.dropped / total if total else 0.0,
+            "latency_p50_ms": float(np.percentile(latencies, 50)),
+            "latency_p99_ms": float(np.percentile(latencies, 99)),
+        }
+
+    def feedback(self):
+        """Recent median transport latency (seconds) and drop rate, as reported to the publisher."""
+        latencies = list(self.latencies)[-100:]
+        drops = sum(self.recent_drops)
+        total = len(self.recent_drops) + drops
+        return {
+            "latency": float(np.median(latencies)) if latencies else None,
+            "drop_rate": drops / total if total else None,
+        }
+
+    def close(self):
+        if self._clock_thread is not None:
+            self._clock_thread.stop()
+        self.socket.close(linger=0)
+
+
+class AsyncStreamClient(StreamClient):
+    """StreamClient on a zmq.asyncio socket: `await client.receive()` or `async for message in client`."""
+
+    @staticmethod
+    def _make_context():
+        return zmq.asyncio.Context.instance()
+
+    async def receive(self, timeout=None):
+        if timeout is not None and not await self.socket.poll(timeout * 1000):
+            return None
+        parts = await self.socket.recv_multipart(copy=False)
+        return self._decode(parts, time.time())
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return await self.receive()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Receive and show the zmq_motion_tracker.py stream")
+    parser.add_argument('--host', default="localhost", help="Publisher host")
+    parser.add_argument('--no_display', action="store_true", help="Only print statistics", default=False)
+    parser.add_argument('--frames_only', action="store_true", help="Subscribe to picture messages only", default=False)
+    args = parser.parse_args()
+
+    client = StreamClient(f"tcp://{args.host}:5555", time_sync_address=f"tcp://{args.host}:5556", decode_frames=not args.no_display, frames_only=args.frames_only)
+    try:
+        print(f"Clock offset: {client.sync_time() * 1000:.3f} ms, round trip {client.clock.round_trip * 1000:.3f} ms", flush=True)
+    except Exception as e:
+        print(f"Time sync failed, latencies include the clock offset: {e}", flush=True)
+    client.start_time_sync()
+
+    last_report = time.time()
+    for message in client:
+        if message.frame is not None:
+            cv2.imshow("Stream", message.frame)
+            if cv2.waitKey(1) == ord('q'):
+                break
+        if message.received_at - last_report >= 1.0:
+            last_report = message.received_at
+            print(f"seq {message.seq}: {len(message.detections)} detections, {client.stats()}", flush=True)
+    client.close()
@@ -0,0 +1,84 @@
+# File: stream_protocol.py
+
+import struct
+import numpy as np
+from detections import DETECTION_DTYPE
+
+# Wire format of the zmq_motion_tracker.py stream. Each message has three parts:
+#   1. HEADER (fixed size, little endian, see below)
+#   2. detections, `count` packed DETECTION_DTYPE records (24 bytes each)
+#   3. frame payload: JPEG bytes, raw BGR pixels (height x width x 3) or empty for detections-only messages
+# With conflate enabled the publisher sends the three parts concatenated as one part, because
+# ZMQ_CONFLATE only works with single-part messages.
+#
+# Every camera frame gets a detections-only message (PAYLOAD_NONE) as soon as its detections
+# are known. Frames that get a picture get a second message with the same seq, carrying the
+# picture and the same detections, once encoding finishes; it usually arrives after the
+# detections of later frames. Sequence gaps are only meaningful between detections messages.
+# Picture messages also carry picture_seq, which counts pictures only (wrapping at 256), so a
+# subscriber taking pictures alone can tell lost pictures from frames the publisher skipped.
+# Since the payload type is the header's fourth byte, frame_subscriptions() lets a subscriber
+# take only picture messages.
+
+MAGIC = b"WM"
+VERSION = 1
+
+PAYLOAD_NONE = 0
+PAYLOAD_JPEG = 1
+PAYLOAD_RAW_BGR = 2
+
+# magic, version, payload type, sequence number, capture time, send time (both server time.time()
+# seconds), frame width, frame height, JPEG quality (0 if not JPEG), picture sequence number,
+# detection count
+HEADER = struct.Struct("<2sBBIddHHBBH")
+
+
+class StreamHeader:
+    __slots__ = ("payload_type", "seq", "capture_timestamp", "send_timestamp", "width", "height", "quality", "count", "picture_seq")
+
+    def __init__(self, payload_type, seq, capture_timestamp, send_timestamp, width, height, quality, count, picture_seq=0):
+        self.payload_type = payload_type
+        self.seq = seq
+        self.capture_timestamp = capture_timestamp
+        self.send_timestamp = send_timestamp
+        self.width = width
+        self.height = height
+        self.quality = quality
+        self.count = count
+        self.picture_seq = picture_seq
+
+    def __repr__(self):
+        return f"StreamHeader(seq={self.seq}, payload_type={self.payload_type}, {self.width}x{self.height}, count={self.count})"
+
+
+def pack_header(payload_type, seq, capture_timestamp, send_timestamp, width, height, quality, count, picture_seq=0):
+    return HEADER.pack(MAGIC, VERSION, payload_type, seq & 0xFFFFFFFF, capture_timestamp, send_timestamp, width, height, quality, picture_seq & 0xFF, count)
+
+
+def unpack_header(buffer):
+    magic, version, payload_type, seq, capture_timestamp, send_timestamp, width, height, quality, picture_seq, count = HEADER.unpack_from(buffer)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"Not a version {VERSION} motion tracker message")
+    return StreamHeader(payload_type, seq, capture_timestamp, send_timestamp, width, height, quality, count, picture_seq)
+
+
+def frame_subscriptions():
+    """ZMQ subscription prefixes that match picture messages only."""
+    return [MAGIC + bytes([VERSION, payload_type]) for payload_type in (PAYLOAD_JPEG, PAYLOAD_RAW_BGR)]
+
+
+def encode_message(seq, detections, payload, payload_type, width, height, capture_timestamp, send_timestamp, quality=0, picture_seq=0):
+    """Build the three message parts; the payload (bytes, buffer or NumPy array) is passed through uncopied."""
+    detections = np.ascontiguousarray(detections, dtype=DETECTION_DTYPE)
+    header = pack_header(payload_type, seq, capture_timestamp, send_timestamp, width, height, quality, len(detections), picture_seq)
+    if payload is None:
+        payload = b""
+    return [header, detections.tobytes(), payload]
+
+
+def split_single_part(buffer):
+    """Split a conflated single-part message back into (header, detections, payload) memoryviews."""
+    view = memoryview(buffer)
+    header = unpack_header(view)
+    detections_end = HEADER.size + header.count * DETECTION_DTYPE.itemsize
+    return view[:HEADER.size], view[HEADER.size:detections_end], view[detections_end:]
@@ -0,0 +1,115 @@
+# File: stream_quality.py
+
+import time
+
+
+class AdaptiveStreamQuality:
+    """
+    Decides how much of each camera frame the publisher sends. Detections always go out for
+    every frame; the picture is degraded step by step while encoding eats too much of the
+    frame period or subscribers report lag or drops, and restored once things stay healthy:
+
+        JPEG quality down to min_quality -> downscale through `scales` -> send a picture only
+        every `frame_interval` frames (detections-only messages in between), up to max_frame_interval
+
+    With adapt_quality False (raw frames, where JPEG quality means nothing) only the scale and
+    frame interval steps are taken. Recovery undoes the steps in reverse order. At most one step is taken per `adjust_interval`
+    seconds, and a step up needs `recover_after` seconds without trouble.
+    """
+
+    def __init__(self, fps=30, quality=90, min_quality=40, quality_step=10, scales=(1.0, 0.75, 0.5),
+                 max_frame_interval=8, encode_budget=0.5, max_latency=0.15, max_drop_rate=0.05,
+                 adjust_interval=0.5, recover_after=3.0, smoothing=0.2, adapt_quality=True):
+        self.frame_period = 1.0 / fps
+        self.max_quality = quality
+        self.min_quality = min_quality
+        self.quality_step = quality_step
+        self.scales = scales
+        self.max_frame_interval = max_frame_interval
+        self.encode_budget = encode_budget  # Fraction of the frame period encoding may use
+        self.max_latency = max_latency
+        self.max_drop_rate = max_drop_rate
+        self.adjust_interval = adjust_interval
+        self.recover_after = recover_after
+        self.smoothing = smoothing
+        self.adapt_quality = adapt_quality
+
+        self.quality = quality
+        self.scale_index = 0
+        self.frame_interval = 1
+        self.encode_time = None
+        self.subscriber_latency = None
+        self.subscriber_drop_rate = None
+
+        self._frame_count = 0
+        self._last_adjust = 0.0
+        self._last_trouble = 0.0
+
+    @property
+    def scale(self):
+        return self.scales[self.scale_index]
+
+    def record_encode(self, seconds):
+        if self.encode_time is None:
+            self.encode_time = seconds
+        else:
+            self.encode_time += self.smoothing * (seconds - self.encode_time)
+
+    def record_feedback(self, latency=None, drop_rate=None):
+        """Worst subscriber transport latency (seconds) and drop rate, or None when unknown."""
+        self.subscriber_latency = latency
+        self.subscriber_drop_rate = drop_rate
+
+    def should_send_frame(self):
+        """Call once per camera frame; False means send this frame's detections only."""
+        send = self._frame_count % self.frame_interval == 0
+        self._frame_count += 1
+        return send
+
+    def in_trouble(self):
+        if self.encode_time is not None and self.encode_time > self.encode_budget * self.frame_period:
+            return True
+        if self.subscriber_latency is not None and self.subscriber_latency > self.max_latency:
+            return True
+        if self.subscriber_drop_rate is not None and self.subscriber_drop_rate > self.max_drop_rate:
+            return True
+        return False
+
+    def _degrade(self):
+        if self.adapt_quality and self.quality - self.quality_step >= self.min_quality:
+            self.quality -= self.quality_step
+        elif self.scale_index + 1 < len(self.scales):
+            self.scale_index += 1
+            self.encode_time = None  # Smaller frames encode faster, measure again
+        elif self.frame_interval < self.max_frame_interval:
+            self.frame_interval *= 2
+
+    def _recover(self):
+        if self.frame_interval > 1:
+            self.frame_interval //= 2
+        elif self.scale_index > 0:
+            self.scale_index -= 1
+            self.encode_time = None
+        elif self.adapt_quality and self.quality < self.max_quality:
+            self.quality = min(self.max_quality, self.quality + self.quality_step)
+
+    def update(self, now=None):
+        """Take at most one step; returns True when the settings changed."""
+        now = time.monotonic() if now is None else now
+        if now - self._last_adjust < self.adjust_interval:
+            return False
+        before = (self.quality, self.scale_index, self.frame_interval)
+        if self.in_trouble():
+            self._last_trouble = now
+            self._degrade()
+        elif now - self._last_trouble >= self.recover_after:
+            self._recover()
+            # Each step up has to stay healthy for recover_after seconds before the next one
+            self._last_trouble = now
+        self._last_adjust = now
+        return before != (self.quality, self.scale_index, self.frame_interval)
+
+    def settings(self):
+        return {"quality": self.quality, "scale": self.scale, "frame_interval": self.frame_interval,
+                "encode_ms": None if self.encode_time is None else self.encode_time * 1000,
+                "subscriber_latency": self.subscriber_latency, "subscriber_drop_rate": self.subscriber_drop_rate}
@@ -0,0 +1,177 @@
+# File: tag_search.py
+
+import collections
+import threading
+import cv2
+import numpy as np
+from tracing import tracer
+from logger import log
+
+
+class TagSearch:
+    """
+    AprilTag search that looks in a window around the predicted tag position first.
+
+    The window is cropped from the BGR frame before the gray conversion, optionally
+    downscaled by `roi_scale`, and the detected corners and centers are mapped back to
+    full-frame pixels. A full-frame search runs when there is no prediction, every
+    `full_frame_interval` frames, and whenever the window search comes up empty.
+    """
+
+    def __init__(self, detector, roi_size=160, roi_scale=1.0, full_frame_interval=10):
+        self.detector = detector
+        self.roi_size = roi_size
+        self.roi_scale = roi_scale
+        self.full_frame_interval = full_frame_interval
+        self.frames_since_full_search = 0
+        self.last_full_search = False
+        self.roi_searches = 0
+        self.full_searches = 0
+
+    def _detect(self, bgr, scale, offset_x, offset_y, trace_frame=None):
+        span_start = tracer.start()
+        gray = cv2.cvtColor(bgr, cv2.COLOR_BGR2GRAY)
+        if scale != 1.0:
+            gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        tracer.stop("cvtColor", span_start, trace_frame)
+
+        span_start = tracer.start()
+        tags = self.detector.detect(gray)
+        tracer.stop("apriltag_detect", span_start, trace_frame)
+
+        if scale == 1.0 and offset_x == 0 and offset_y == 0:
+            return tags
+
+        # Map back to full-frame pixel coordinates
+        offset = np.array([offset_x, offset_y], dtype=np.float64)
+        return [tag._replace(corners=tag.corners / scale + offset, center=tag.center / scale + offset) for tag in tags]
+
+    def detect(self, frame, prediction=None, trace_frame=None, force_full=None):
+        """
+        Return the AprilTags in `frame` (BGR) with full-frame pixel corners.
+        prediction is the expected tag center in pixels of `frame`, or None if unknown.
+        force_full overrides this search's own full_frame_interval cadence (TagSearchPool
+        keeps one cadence for all its workers); last_full_search tells whether one ran.
+        """
+        height, width = frame.shape[:2]
+        if force_full is None:
+            self.frames_since_full_search += 1
+            force_full = self.frames_since_full_search >= self.full_frame_interval
+        self.last_full_search = False
+
+        if prediction is not None and not force_full:
+            half = self.roi_size // 2
+            cx = int(min(max(prediction[0], 0), width - 1))
+            cy = int(min(max(prediction[1], 0), height - 1))
+            x0, y0 = max(0, cx - half), max(0, cy - half)
+            x1, y1 = min(width, cx + half), min(height, cy + half)
+
+            self.roi_searches += 1
+            tags = self._detect(frame[y0:y1, x0:x1], self.roi_scale, x0, y0, trace_frame)
+            if tags:
+                return tags
+
+        self.frames_since_full_search = 0
+        self.last_full_search = True
+        self.full_searches += 1
+        return self._detect(frame, 1.0, 0, 0, trace_frame)
+
+
+class TagSearchPool:
+    """
+    Runs TagSearch on worker threads so the main loop can receive and preprocess the next
+    frame while the current frame's tags are still being found.
+
+    Frames are submitted with a sequence number into a bounded queue; when it is full the
+    oldest waiting frame is dropped. result(seq) blocks until that frame's tags are ready
+    and returns None for a dropped frame. The apriltag detector runs in C through ctypes,
+    which releases the GIL, so threads give real parallelism without pickling frames.
+
+    Each worker has its own TagSearch (and detector), but the full-frame cadence is counted
+    here over submitted frames, so it stays every full_frame_interval frames for any number
+    of workers.
+    """
+
+    def __init__(self, tag_search_factory, workers=2, queue_size=4):
+        self.queue_size = queue_size
+        self.dropped = 0
+        self.submitted = 0
+        self.completed = 0
+
+        self._next_seq = 0
+        self._queue = collections.deque()
+        self._results = {}
+        self._condition = threading.Condition()
+        self._stopped = False
+        tag_searches = [tag_search_factory() for _ in range(workers)]
+        self.full_frame_interval = tag_searches[0].full_frame_interval
+        self.frames_since_full_search = 0
+        self._workers = [
+            threading.Thread(target=self._work, args=(tag_search,), name=f"TagSearch-{i}", daemon=True)
+            for i, tag_search in enumerate(tag_searches)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    @property
+    def queue_depth(self):
+        return len(self._queue)
+
+    def submit(self, frame, prediction=None):
+        """Queue a frame for tag search and return its sequence number."""
+        with self._condition:
+            seq = self._next_seq
+            self._next_seq += 1
+            if len(self._queue) >= self.queue_size:
+                dropped_seq, _, _, _, dropped_full = self._queue.popleft()
+                self._results[dropped_seq] = None
+                self.dropped += 1
+                if dropped_full:
+                    # Its full-frame search is still due, move it to this frame
+                    self.frames_since_full_search = self.full_frame_interval
+            self.frames_since_full_search += 1
+            force_full = self.frames_since_full_search >= self.full_frame_interval
+            if force_full:
+                self.frames_since_full_search = 0
+            self._queue.append((seq, frame, prediction, tracer.frame, force_full))
+            self.submitted += 1
+            self._condition.notify_all()
+        return seq
+
+    def result(self, seq, timeout=None):
+        """Wait for the tags of frame `seq`; None if the frame was dropped or the wait timed out."""
+        with self._condition:
+            self._condition.wait_for(lambda: seq in self._results or self._stopped, timeout)
+            return self._results.pop(seq, None)
+
+    def _work(self, tag_search):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._queue or self._stopped)
+                if self._stopped:
+                    return
+                seq, frame, prediction, trace_frame, force_full = self._queue.popleft()
+
+            try:
+                tags = tag_search.detect(frame, prediction, trace_frame, force_full)
+            except Exception as e:
+                log.error("Tag search failed on frame %s: %s", seq, e, every=1.0)
+                tags = []
+
+            with self._condition:
+                if tag_search.last_full_search and not force_full:
+                    # A window search came up empty and fell back to the full frame
+                    self.frames_since_full_search = 0
+                self._results[seq] = tags
+                self.completed += 1
+                self._condition.notify_all()
+
+    def stats(self):
+        return {"queue_depth": self.queue_depth, "submitted": self.submitted, "completed": self.completed, "dropped": self.dropped}
+
+    def stop(self):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+        for worker in self._workers:
+            worker.join()
@@ -0,0 +1,109 @@
+# File: target_estimator.py
+
+import numpy as np
+
+
+class TargetStateEstimator:
+    """
+    Constant-velocity Kalman filter for the target position, driven by real frame timestamps.
+
+    State is [x, y, vx, vy] with velocity in units per second. The transition matrix is
+    rebuilt in place from the actual time since the previous frame, so dropped frames just
+    mean a longer prediction step. process_noise and measurement_noise keep the meaning of
+    the old per-frame cv2.KalmanFilter settings: at dt == nominal_dt this filter is the old
+    one with velocity expressed per second instead of per frame, and the process noise grows
+    linearly with dt for longer or shorter steps.
+    """
+
+    def __init__(self, process_noise=6.0, measurement_noise=4.0, nominal_dt=1 / 30, max_dt=0.5):
+        self.nominal_dt = nominal_dt
+        self.max_dt = max_dt
+        self.timestamp = None
+        self.initialized = False
+
+        # Preallocated filter matrices, updated in place
+        self.state = np.zeros(4)
+        self.covariance = np.zeros((4, 4))
+        self._transition = np.eye(4)
+        self._process_cov = np.zeros((4, 4))
+        self._measurement_cov = np.eye(2)
+        self._identity = np.eye(4)
+        # Converts per-frame variances of the velocity terms to per-second units
+        self._velocity_scale = np.array([1.0, 1.0, 1.0 / nominal_dt ** 2, 1.0 / nominal_dt ** 2])
+        np.fill_diagonal(self.covariance, self._velocity_scale)
+
+        self.process_noise = None
+        self.measurement_noise = None
+        self.set_noise(process_noise, measurement_noise)
+
+    def set_noise(self, process_noise, measurement_noise):
+        """Apply new tuning values; the noise matrices are only rebuilt when a value changes."""
+        if process_noise != self.process_noise:
+            self.process_noise = float(process_noise)
+        if measurement_noise != self.measurement_noise:
+            self.measurement_noise = float(measurement_noise)
+            self._measurement_cov[:] = 0.0
+            self._measurement_cov[0, 0] = self._measurement_cov[1, 1] = self.measurement_noise
+
+    def reset(self, position=None, timestamp=None):
+        self.state[:] = 0.0
+        self.covariance[:] = 0.0
+        np.fill_diagonal(self.covariance, self._velocity_scale)
+        self.timestamp = timestamp
+        self.initialized = position is not None
+        if position is not None:
+            self.state[:2] = position
+
+    def _dt(self, timestamp):
+        if timestamp is None or self.timestamp is None:
+            return self.nominal_dt
+        return min(max(timestamp - self.timestamp, 0.0), self.max_dt)
+
+    def predict(self, timestamp=None):
+        """Advance the state to `timestamp` (seconds) and return the predicted position."""
+        dt = self._dt(timestamp)
+        if timestamp is not None:
+            self.timestamp = timestamp
+
+        self._transition[0, 2] = self._transition[1, 3] = dt
+        self._process_cov[:] = 0.0
+        np.fill_diagonal(self._process_cov, self._velocity_scale * (self.process_noise * dt / self.nominal_dt))
+
+        self.state[:] = self._transition @ self.state
+        self.covariance[:] = self._transition @ self.covariance @ self._transition.T + self._process_cov
+        return self.state[:2].copy()
+
+    def correct(self, measurement):
+        """Fuse a position measurement and return the corrected position."""
+        measurement = np.asarray(measurement, dtype=np.float64).reshape(2)
+        if not self.initialized:
+            # Start at the first measurement instead of converging from the origin
+            self.state[:2] = measurement
+            self.initialized = True
+            return self.state[:2].copy()
+
+        # H selects the position, so H P H^T and P H^T are just slices of P
+        innovation = measurement - self.state[:2]
+        innovation_cov = self.covariance[:2, :2] + self._measurement_cov
+        gain = self.covariance[:, :2] @ np.linalg.inv(innovation_cov)
+
+        self.state += gain @ innovation
+        self.covariance[:] = (self._identity - gain @ self._identity[:2]) @ self.covariance
+        return self.state[:2].copy()
+
+    def update(self, measurement, timestamp=None):
+        """Predict to `timestamp`, then correct with `measurement`."""
+        self.predict(timestamp)
+        return self.correct(measurement)
+
+    @property
+    def position(self):
+        return self.state[0], self.state[1]
+
+    @property
+    def velocity(self):
+        return self.state[2], self.state[3]
+
+    def predict_ahead(self, horizon):
+        """Position `horizon` seconds past the last update, without changing the filter."""
+        return self.state[:2] + self.state[2:] * horizon
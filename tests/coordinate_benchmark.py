@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+# Per-point cost of the CoordinateSystem conversions for 1, 10 and 1000 targets, one call for all points vs one call per point
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from coordinate_system import CoordinateSystem
+
+parser = argparse.ArgumentParser()
+parser.add_argument('-n', '--iterations', type=int, default=200, help="Repetitions per measurement")
+parser.add_argument('--targets', type=int, nargs='+', default=[1, 10, 1000], help="Target counts to measure")
+args = parser.parse_args()
+
+
+def aim(x, y, vx, vy):
+    # The full per-frame chain: lead the targets, convert to angles and map onto the pan/tilt range
+    ix, iy = CoordinateSystem.calculate_interception_point(x, y, vx, vy, 0.1)
+    CoordinateSystem.pixels_to_angle(ix, iy)
+    pan = CoordinateSystem.image_position_to_servo_goal(ix, CoordinateSystem.IMAGE_WIDTH_PIXELS, 0, 5000)
+    tilt = CoordinateSystem.image_position_to_servo_goal(iy, CoordinateSystem.IMAGE_HEIGHT_PIXELS, 1500, 1900)
+    return pan, tilt
+
+
+def measure(function, iterations):
+    samples = []
+    for i in range(iterations):
+        start = time.perf_counter()
+        function()
+        samples.append(time.perf_counter() - start)
+    return np.array(samples)
+
+
+def report(name, samples, points):
+    per_point = samples / points * 1e6
+    print('{:<24} {:6d} targets   {:9.3f} us/point, p50 {:9.3f} us/point, p99 {:9.3f} us/point'.format(
+        name, points, np.average(per_point), np.percentile(per_point, 50), np.percentile(per_point, 99)))
+
+
+rng = np.random.default_rng(0)
+for count in args.targets:
+    x = rng.uniform(0, CoordinateSystem.IMAGE_WIDTH_PIXELS, count)
+    y = rng.uniform(0, CoordinateSystem.IMAGE_HEIGHT_PIXELS, count)
+    vx = rng.normal(0, 200, count)
+    vy = rng.normal(0, 200, count)
+
+    x_before = x.copy()
+    report("vectorized", measure(lambda: aim(x, y, vx, vy), args.iterations), count)
+    assert np.array_equal(x, x_before), "CoordinateSystem modified its input"
+
+    points = list(zip(x.tolist(), y.tolist(), vx.tolist(), vy.tolist()))
+    report("per-point scalar calls", measure(lambda: [aim(*point) for point in points], max(1, args.iterations // max(1, count // 10))), count)
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# Measures DynamixelController bus throughput against the pty servo emulator (no hardware needed)
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from dynamixel_controller import DynamixelController
+from dynamixel_emulator import DynamixelEmulator
+
+parser = argparse.ArgumentParser()
+parser.add_argument('-n', '--iterations', type=int, default=500, help="Transactions per measurement")
+parser.add_argument('-b', '--baudrate', type=int, default=1000000, help="Emulated bus baud rate")
+parser.add_argument('--return_delay', type=int, default=250, help="Emulated Return Delay Time register (2 us units)")
+parser.add_argument('--no_timing', action="store_true", help="Disable transfer time and return delay modelling", default=False)
+args = parser.parse_args()
+
+
+def report(name, samples):
+    samples = np.array(samples) * 1000
+    print('{:<28} {:8.1f} tx/s   mean {:.3f} ms, p50 {:.3f} ms, p99 {:.3f} ms, Std: {:.3f}'.format(
+        name, 1000 / np.average(samples), np.average(samples), np.percentile(samples, 50), np.percentile(samples, 99), np.std(samples)))
+
+
+def measure(function, iterations):
+    samples = []
+    for i in range(iterations):
+        start = time.perf_counter()
+        function(i)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+with DynamixelEmulator(baudrate=args.baudrate, model_timing=not args.no_timing, return_delay_time=args.return_delay) as emulator:
+    controller = DynamixelController(emulator.port_name, args.baudrate, 1, 2)
+    pan, tilt = controller.PAN_CENTER_POSITION, controller.TILT_CENTER_POSITION
+    controller.set_goal_position(pan, tilt)
+    time.sleep(1)
+
+    report("set_goal_position", measure(lambda i: controller.set_goal_position(pan + (i % 2), tilt), args.iterations))
+    report("get_present_position", measure(lambda i: controller.get_present_position(), args.iterations))
+    report("read_telemetry", measure(lambda i: controller.read_telemetry(), args.iterations))
+
+    # Closed-loop moves: alternate between two targets and time each move until settled
+    targets = [(pan + 400, tilt + 100), (pan - 400, tilt - 100)]
+    moves = max(4, args.iterations // 100)
+    report("set_goal_position_with_pid", measure(lambda i: controller.set_goal_position_with_pid(*targets[i % 2]), moves))
+
+    emulator.reset_stats()
+    start = time.perf_counter()
+    settled = False
+    while not settled:
+        settled = controller.step_goal_position_with_pid(*targets[0])
+    print('step_goal_position_with_pid move: {:.1f} ms, {} instruction packets, {} status packets'.format(
+        (time.perf_counter() - start) * 1000, emulator.stats["instruction_packets"], emulator.stats["status_packets"]))
+
+    controller.close()
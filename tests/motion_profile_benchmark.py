@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# Compares host-side PID stepping with servo-side motion profiles on the pty servo emulator:
+# bus traffic and settle time per move, plus following a target that moves every frame
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from dynamixel_controller import DynamixelController
+from dynamixel_emulator import DynamixelEmulator
+
+parser = argparse.ArgumentParser()
+parser.add_argument('-n', '--moves', type=int, default=10, help="Point-to-point moves per mode")
+parser.add_argument('--period', type=float, default=0.01, help="Control loop period in seconds, as in ServoCommandThread")
+parser.add_argument('--profile_velocity', type=int, default=0, help="Profile Velocity register (0.229 rpm units, 0 is the servo's maximum)")
+parser.add_argument('--profile_acceleration', type=int, default=1000, help="Profile Acceleration register (214.577 rev/min^2 units)")
+parser.add_argument('--follow_seconds', type=float, default=3.0, help="Duration of the moving-target run")
+args = parser.parse_args()
+
+
+def run_move(step, emulator, goal, timeout=5.0):
+    """Drive one move the way ServoCommandThread does and return (settle seconds, instruction packets, status packets, bytes)."""
+    emulator.reset_stats()
+    start = time.perf_counter()
+    while not step(*goal, tolerance=10):
+        if time.perf_counter() - start > timeout:
+            break
+        time.sleep(args.period)
+    elapsed = time.perf_counter() - start
+    stats = emulator.stats
+    return elapsed, stats["instruction_packets"], stats["status_packets"], stats["rx_bytes"] + stats["tx_bytes"]
+
+
+def run_follow(step, emulator, controller, fps=30):
+    """Chase a target on a sine path with a new goal every frame; returns traffic and mean tracking error."""
+    emulator.reset_stats()
+    errors = []
+    start = time.perf_counter()
+    next_frame = start
+    goal = None
+    while True:
+        now = time.perf_counter()
+        if now - start > args.follow_seconds:
+            break
+        if now >= next_frame:
+            t = now - start
+            goal = (int(controller.PAN_CENTER_POSITION + 600 * np.sin(2 * np.pi * 0.5 * t)), controller.TILT_CENTER_POSITION)
+            next_frame += 1 / fps
+            errors.append(abs(emulator.servo(1).position - goal[0]))
+        step(*goal, tolerance=10)
+        time.sleep(args.period)
+    stats = emulator.stats
+    return stats["instruction_packets"], stats["status_packets"], stats["rx_bytes"] + stats["tx_bytes"], np.average(errors)
+
+
+with DynamixelEmulator() as emulator:
+    controller = DynamixelController(emulator.port_name, 1000000, 1, 2)
+    pan, tilt = controller.PAN_CENTER_POSITION, controller.TILT_CENTER_POSITION
+    targets = [(pan + 800, tilt + 150), (pan - 800, tilt - 150)]
+
+    modes = [("pid", controller.step_goal_position_with_pid), ("profile", controller.step_goal_position_with_profile)]
+    for name, step in modes:
+        if name == "profile":
+            controller.set_motion_profile(args.profile_velocity, args.profile_acceleration)
+        else:
+            controller.set_motion_profile(0, 0)
+
+        # Start every mode from the same place
+        controller.set_goal_position(pan, tilt)
+        time.sleep(1.5)
+
+        results = np.array([run_move(step, emulator, targets[i % 2]) for i in range(args.moves)])
+        settle = results[:, 0] * 1000
+        print('{:<8} move: settle mean {:.1f} ms, p50 {:.1f} ms, max {:.1f} ms   {:.1f} instruction / {:.1f} status packets, {:.0f} bytes per move'.format(
+            name, np.average(settle), np.percentile(settle, 50), np.max(settle), np.average(results[:, 1]), np.average(results[:, 2]), np.average(results[:, 3])))
+
+        instructions, statuses, traffic, error = run_follow(step, emulator, controller)
+        print('{:<8} follow: {:.1f} instruction / {:.1f} status packets per second, {:.0f} bytes/s, mean pan error {:.1f} ticks'.format(
+            name, instructions / args.follow_seconds, statuses / args.follow_seconds, traffic / args.follow_seconds, error))
@@ -0,0 +1,206 @@
+# File: time_sync.py
+
+import threading
+import time
+import uuid
+import numpy as np
+import zmq
+
+
+class TimeSyncServer(threading.Thread):
+    """
+    Answers client_time_sync requests on a REP socket from its own thread, so a reply never
+    waits behind frame processing. Replies carry the request's receive and reply's send time
+    (server time.time()) for NTP-style offset estimation; server_timestamp is kept for older
+    clients. Requests may also carry a client's stream feedback (its transport latency and
+    drop rate), which feedback() summarizes for the publisher. Messages are JSON, never
+    pickles, since any host that reaches the port can send them.
+    """
+
+    def __init__(self, address="tcp://*:5556", context=None, poll_interval=0.1):
+        super().__init__(name="TimeSyncServer", daemon=True)
+        self.address = address
+        self.context = context if context is not None else zmq.Context.instance()
+        self.poll_interval = poll_interval
+        self.requests = 0
+        self.feedback_timeout = 10.0
+        self._feedback = {}
+        self._feedback_lock = threading.Lock()
+        self.stop_event = threading.Event()
+        # Bind here so a port clash shows up in the constructor, not silently in the thread
+        self.socket = self.context.socket(zmq.REP)
+        self.socket.bind(address)
+
+    def run(self):
+        try:
+            while not self.stop_event.is_set():
+                if not self.socket.poll(self.poll_interval * 1000):
+                    continue
+                try:
+                    message = self.socket.recv_json()
+                except ValueError:
+                    message = None
+                received = time.time()
+                if not isinstance(message, dict) or message.get("type") != "client_time_sync":
+                    self.socket.send_json({"type": "error", "message": "expected client_time_sync"})
+                    continue
+                self.requests += 1
+                if isinstance(message.get("client_id"), str):
+                    with self._feedback_lock:
+                        self._feedback[message["client_id"]] = (time.monotonic(), self._number(message.get("latency")), self._number(message.get("drop_rate")))
+                self.socket.send_json({
+                    "type": "server_time_sync",
+                    "client_timestamp": message.get("client_timestamp"),
+                    "server_timestamp": received,
+                    "server_receive_timestamp": received,
+                    "server_send_timestamp": time.time(),
+                })
+        finally:
+            self.socket.close(linger=0)
+
+    @staticmethod
+    def _number(value):
+        return float(value) if isinstance(value, (int, float)) and not isinstance(value, bool) else None
+
+    def feedback(self):
+        """Worst (latency, drop rate) reported by clients heard from recently; None where nobody reported."""
+        now = time.monotonic()
+        with self._feedback_lock:
+            for client_id in [c for c, (received, _, _) in self._feedback.items() if now - received > self.feedback_timeout]:
+                del self._feedback[client_id]
+            latencies = [latency for _, latency, _ in self._feedback.values() if latency is not None]
+            drop_rates = [drop_rate for _, _, drop_rate in self._feedback.values() if drop_rate is not None]
+        return (max(latencies) if latencies else None), (max(drop_rates) if drop_rates else None)
+
+    def stop(self):
+        self.stop_event.set()
+        if self.is_alive():
+            self.join()
+
+
+class ClockSync:
+    """
+    Client-side estimate of the server clock, server_time = local_time + offset_at(local_time).
+
+    Each sync() sends a burst of requests and keeps only the exchange with the smallest round
+    trip, whose offset is least disturbed by queueing (the NTP clock filter). The filtered
+    offsets of the last `history` bursts are fitted with a line to get a smoothed offset and
+    the drift between the two clocks, in seconds per second. `report`, if given, returns a
+    dict (latency, drop_rate) sent along with every request as feedback for the publisher.
+    """
+
+    def __init__(self, address="tcp://localhost:5556", context=None, timeout=0.5, history=16, report=None):
+        self.address = address
+        self.report = report
+        self.client_id = uuid.uuid4().hex
+        self.context = context if context is not None else zmq.Context.instance()
+        self.timeout = timeout
+        self.samples = []  # (local time, offset, round trip) of each burst's best exchange
+        self.history = history
+        self.offset = 0.0
+        self.drift = 0.0
+        self.reference_time = None
+        self.round_trip = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def exchange_offset(t0, t1, t2, t3):
+        """NTP offset and round trip from client send t0, server receive t1, server send t2 and client receive t3."""
+        offset = ((t1 - t0) + (t2 - t3)) / 2
+        round_trip = (t3 - t0) - (t2 - t1)
+        return offset, round_trip
+
+    def _exchange(self, requester):
+        message = {"type": "client_time_sync", "client_id": self.client_id}
+        if self.report is not None:
+            message.update(self.report())
+        t0 = time.time()
+        message["client_timestamp"] = t0
+        requester.send_json(message)
+        if not requester.poll(self.timeout * 1000):
+            return None
+        reply = requester.recv_json()
+        t3 = time.time()
+        t1 = reply.get("server_receive_timestamp", reply["server_timestamp"])
+        t2 = reply.get("server_send_timestamp", t1)
+        return (t0 + t3) / 2, *self.exchange_offset(t0, t1, t2, t3)
+
+    def sync(self, exchanges=8):
+        """Run a burst of exchanges, fold the best one into the estimate and return the current offset."""
+        requester = self.context.socket(zmq.REQ)
+        requester.setsockopt(zmq.LINGER, 0)
+        requester.connect(self.address)
+        best = None
+        try:
+            for _ in range(exchanges):
+                sample = self._exchange(requester)
+                if sample is None:
+                    # A REQ socket without a reply cannot send again, start over on a new one
+                    requester.close()
+                    requester = self.context.socket(zmq.REQ)
+                    requester.setsockopt(zmq.LINGER, 0)
+                    requester.connect(self.address)
+                    continue
+                if best is None or sample[2] < best[2]:
+                    best = sample
+        finally:
+            requester.close()
+        if best is None:
+            raise Exception(f"No time sync reply from {self.address}")
+
+        with self._lock:
+            self.samples.append(best)
+            del self.samples[:-self.history]
+            self._fit()
+            return self.offset
+
+    def _fit(self):
+        times = np.array([sample[0] for sample in self.samples])
+        offsets = np.array([sample[1] for sample in self.samples])
+        self.round_trip = self.samples[-1][2]
+        self.reference_time = times[-1]
+        if len(self.samples) < 3 or np.ptp(times) < 1.0:
+            # Too little history for a drift estimate
+            self.offset = float(np.median(offsets))
+            self.drift = 0.0
+            return
+        drift, intercept = np.polyfit(times - self.reference_time, offsets, 1)
+        self.drift = float(drift)
+        self.offset = float(intercept)
+
+    def offset_at(self, local_time=None):
+        with self._lock:
+            if self.reference_time is None:
+                return self.offset
+            if local_time is None:
+                local_time = time.time()
+            return self.offset + self.drift * (local_time - self.reference_time)
+
+    def server_time(self, local_time=None):
+        local_time = time.time() if local_time is None else local_time
+        return local_time + self.offset_at(local_time)
+
+
+class ClockSyncThread(threading.Thread):
+    """Calls ClockSync.sync() every `interval` seconds in the background."""
+
+    def __init__(self, clock_sync, interval=10.0, exchanges=8):
+        super().__init__(name="ClockSync", daemon=True)
+        self.clock_sync = clock_sync
+        self.interval = interval
+        self.exchanges = exchanges
+        self.stop_event = threading.Event()
+        self.failures = 0
+
+    def run(self):
+        while not self.stop_event.is_set():
+            try:
+                self.clock_sync.sync(self.exchanges)
+            except Exception:
+                self.failures += 1
+            self.stop_event.wait(self.interval)
+
+    def stop(self):
+        self.stop_event.set()
+        if self.is_alive():
+            self.join()
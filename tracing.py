@@ -0,0 +1,92 @@
+# File: tracing.py
+
+import collections
+import json
+import os
+import threading
+import time
+
+
+class Tracer:
+    """
+    Records named spans into a fixed-size in-memory ring buffer and exports them as
+    Chrome trace-event JSON (load in chrome://tracing or https://ui.perfetto.dev).
+
+    Recording a span is a perf_counter_ns() call and a deque append, cheap enough to leave
+    enabled in production. Use start()/stop() on hot paths and span() elsewhere.
+    """
+
+    def __init__(self, capacity=65536, enabled=True):
+        self.enabled = enabled
+        self.frame = 0
+        self._events = collections.deque(maxlen=capacity)
+        self._thread_names = {}
+
+    def next_frame(self):
+        """Mark the arrival of a new frame; subsequent spans are tagged with its sequence number."""
+        self.frame += 1
+        return self.frame
+
+    @staticmethod
+    def start():
+        return time.perf_counter_ns()
+
+    def stop(self, name, start_ns, frame=None):
+        if self.enabled:
+            self.record(name, start_ns, time.perf_counter_ns(), frame)
+
+    def record(self, name, start_ns, end_ns, frame=None):
+        """Record a span with explicit perf_counter_ns() timestamps."""
+        if not self.enabled:
+            return
+        tid = threading.get_ident()
+        if tid not in self._thread_names:
+            self._thread_names[tid] = threading.current_thread().name
+        self._events.append((name, start_ns, end_ns - start_ns, tid, self.frame if frame is None else frame))
+
+    def span(self, name):
+        return _Span(self, name)
+
+    def clear(self):
+        self._events.clear()
+
+    def to_chrome_trace(self):
+        pid = os.getpid()
+        events = [
+            {"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}}
+            for tid, name in list(self._thread_names.items())
+        ]
+        for name, start_ns, duration_ns, tid, frame in list(self._events):
+            events.append({
+                "name": name,
+                "ph": "X",
+                "ts": start_ns / 1000.0,
+                "dur": duration_ns / 1000.0,
+                "pid": pid,
+                "tid": tid,
+                "args": {"frame": frame},
+            })
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def dump(self, path):
+        with open(path, "w") as file:
+            json.dump(self.to_chrome_trace(), file)
+
+
+class _Span:
+    __slots__ = ("tracer", "name", "start_ns")
+
+    def __init__(self, tracer, name):
+        self.tracer = tracer
+        self.name = name
+
+    def __enter__(self):
+        self.start_ns = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.tracer.stop(self.name, self.start_ns)
+
+
+# Shared process-wide tracer
+tracer = Tracer()
@@ -0,0 +1,281 @@
+# File: tracker_daemon.py
+
+import argparse
+import threading
+import time
+import zmq
+
+# Local socket the kiosk sends mode commands on
+CONTROL_ADDRESS = "ipc:///tmp/wingman_control"
+
+
+class ControlServer(threading.Thread):
+    """
+    Answers control requests on a REP socket from its own thread. `handler` gets each request
+    dictionary and returns the reply dictionary; a failing handler or a request that is not
+    JSON is answered with an error reply so the REP socket never gets stuck. Messages are
+    JSON, never pickles: any local user can reach the socket.
+    """
+
+    def __init__(self, handler, address=CONTROL_ADDRESS, context=None, poll_interval=0.1):
+        super().__init__(name="ControlServer", daemon=True)
+        self.handler = handler
+        self.address = address
+        self.context = context if context is not None else zmq.Context.instance()
+        self.poll_interval = poll_interval
+        self.stop_event = threading.Event()
+        # Bind here so a second daemon fails at startup instead of silently in the thread
+        self.socket = self.context.socket(zmq.REP)
+        self.socket.bind(address)
+
+    def run(self):
+        try:
+            while not self.stop_event.is_set():
+                if not self.socket.poll(self.poll_interval * 1000):
+                    continue
+                try:
+                    message = self.socket.recv_json()
+                except ValueError:
+                    self.socket.send_json({"type": "error", "message": "expected JSON"})
+                    continue
+                try:
+                    reply = self.handler(message)
+                except Exception as e:
+                    reply = {"type": "error", "message": str(e)}
+                self.socket.send_json(reply)
+        finally:
+            self.socket.close(linger=0)
+
+    def stop(self):
+        self.stop_event.set()
+        if self.is_alive():
+            self.join()
+
+
+class ControlClient:
+    """Sends mode commands to a running tracker daemon; request() returns None on timeout."""
+
+    def __init__(self, address=CONTROL_ADDRESS, context=None, timeout=0.5):
+        self.address = address
+        self.context = context if context is not None else zmq.Context.instance()
+        self.timeout = timeout
+        self.socket = None
+
+    def _connect(self):
+        self.socket = self.context.socket(zmq.REQ)
+        self.socket.setsockopt(zmq.LINGER, 0)
+        self.socket.connect(self.address)
+
+    def request(self, message):
+        if self.socket is None:
+            self._connect()
+        self.socket.send_json(message)
+        if not self.socket.poll(self.timeout * 1000):
+            # A REQ socket without a reply cannot send again, start over on a new one
+            self.socket.close()
+            self.socket = None
+            return None
+        try:
+            return self.socket.recv_json()
+        except ValueError:
+            return None
+
+    def set_mode(self, mode):
+        return self.request({"type": "set_mode", "mode": mode})
+
+    def status(self):
+        return self.request({"type": "status"})
+
+    def shutdown(self):
+        return self.request({"type": "shutdown"})
+
+    def close(self):
+        if self.socket is not None:
+            self.socket.close()
+            self.socket = None
+
+
+class JoystickDriver(threading.Thread):
+    """
+    Manual aiming with a PS4 controller through the tracker's ServoCommandThread, so the
+    joystick and the tracker share one open bus. The right stick sets the goal's speed
+    (ticks per second at full deflection, after a dead zone); R2 holds the relay. Goals are
+    only posted while `active`, and each activation starts from the last posted goal.
+    """
+
+    def __init__(self, servo_thread, home_position, limits, relay_pin=None, interface="/dev/input/js0",
+                 pan_rate=1500, tilt_rate=500, dead_zone=6000, period=0.01):
+        super().__init__(name="JoystickDriver", daemon=True)
+        self.servo_thread = servo_thread
+        self.home_position = home_position
+        self.limits = limits  # ((pan min, pan max), (tilt min, tilt max))
+        self.relay_pin = relay_pin
+        self.interface = interface
+        self.pan_rate = pan_rate
+        self.tilt_rate = tilt_rate
+        self.dead_zone = dead_zone
+        self.period = period
+
+        self.stick = [0, 0]  # Raw pan and tilt stick values, -32767..32767
+        self.active = False
+        self.goal = None
+        self.stop_event = threading.Event()
+
+    def set_active(self, active):
+        if active and not self.active:
+            self.goal = list(self.servo_thread.last_goal or self.home_position)
+            self.stick = [0, 0]
+        self.active = active
+        if not active:
+            self.set_relay(False)
+
+    def set_relay(self, on):
+        if self.relay_pin is None:
+            return
+        import Jetson.GPIO as GPIO
+        GPIO.output(self.relay_pin, GPIO.HIGH if on and self.active else GPIO.LOW)
+
+    def _axis_speed(self, value, rate):
+        if -self.dead_zone < value < self.dead_zone:
+            return 0.0
+        return value / 32767 * rate
+
+    def run(self):
+        last = time.monotonic()
+        while not self.stop_event.is_set():
+            self.stop_event.wait(self.period)
+            now = time.monotonic()
+            dt, last = now - last, now
+            if not self.active or self.goal is None:
+                continue
+            pan_speed = self._axis_speed(self.stick[0], self.pan_rate)
+            tilt_speed = self._axis_speed(self.stick[1], self.tilt_rate)
+            if not pan_speed and not tilt_speed:
+                continue
+            for axis, speed in ((0, pan_speed), (1, tilt_speed)):
+                low, high = self.limits[axis]
+                self.goal[axis] = min(max(self.goal[axis] + speed * dt, low), high)
+            self.servo_thread.set_goal(int(self.goal[0]), int(self.goal[1]))
+
+    def listen(self):
+        """Read controller events on a background thread (needs pyPS4Controller)."""
+        from pyPS4Controller.controller import Controller
+        driver = self
+
+        class PS4Input(Controller):
+            def on_R3_up(self, value):
+                driver.stick[1] = -value
+            def on_R3_down(self, value):
+                driver.stick[1] = -value
+            def on_R3_left(self, value):
+                driver.stick[0] = value
+            def on_R3_right(self, value):
+                driver.stick[0] = value
+            def on_R3_y_at_rest(self):
+                driver.stick[1] = 0
+            def on_R3_x_at_rest(self):
+                driver.stick[0] = 0
+            def on_R2_press(self, value):
+                driver.set_relay(True)
+            def on_R2_release(self, *args):
+                driver.set_relay(False)
+
+        controller = PS4Input(interface=self.interface, connecting_using_ds4drv=False)
+        listener = threading.Thread(target=controller.listen, name="PS4Input", daemon=True)
+        listener.start()
+        return listener
+
+    def stop(self):
+        self.active = False
+        self.stop_event.set()
+        if self.is_alive():
+            self.join()
+
+
+class TrackerDaemon:
+    """
+    Keeps one Application (camera pipeline, bus, servo thread) running for the lifetime of the
+    kiosk and switches between autonomous tracking, manual joystick aiming and idle on
+    command, instead of starting a new main.py or ps4.py process for every mode. Idle
+    keeps the process running; a shutdown request stops it and releases the bus.
+    """
+
+    MODES = ("track", "joystick", "idle")
+
+    def __init__(self, application, mode="idle", control_address=CONTROL_ADDRESS, joystick_interface="/dev/input/js0"):
+        self.application = application
+        controller = application.dynamixel_controller
+        self.joystick = JoystickDriver(
+            application.servo_thread, application.home_position,
+            ((controller.PAN_MIN_POSITION, controller.PAN_MAX_POSITION), (controller.TILT_MIN_POSITION, controller.TILT_MAX_POSITION)),
+            relay_pin=application.relay_pin, interface=joystick_interface)
+        self.control_server = ControlServer(self.handle, control_address)
+        self.set_mode(mode)
+
+    @property
+    def mode(self):
+        return self.application.mode
+
+    def set_mode(self, mode):
+        if mode not in self.MODES:
+            raise Exception(f"Unknown mode {mode!r}, expected one of {self.MODES}")
+        # The frame loop keeps running in every mode; only who posts servo goals changes
+        self.application.mode = mode
+        self.joystick.set_active(mode == "joystick")
+        print(f"Mode: {mode}", flush=True)
+
+    def handle(self, message):
+        if not isinstance(message, dict):
+            return {"type": "error", "message": "expected a dictionary"}
+        if message.get("type") == "shutdown":
+            print("Shutting down", flush=True)
+            self.application.stop()
+            return {"type": "shutdown"}
+        if message.get("type") == "set_mode":
+            self.set_mode(message.get("mode"))
+        elif message.get("type") != "status":
+            return {"type": "error", "message": f"unknown request {message.get('type')!r}"}
+        return {"type": "mode", "mode": self.mode, "gains": self.gains()}
+
+    def gains(self):
+        """Current PID gains, so the kiosk can show them without opening the bus itself."""
+        controller = self.application.dynamixel_controller
+        return {f"{prefix}_{name}": getattr(pid, name)
+                for prefix, pid in (("pan", controller.pan_pid), ("tilt", controller.tilt_pid))
+                for name in ("kp", "ki", "kd")}
+
+    def run(self):
+        self.joystick.start()
+        try:
+            self.joystick.listen()
+        except Exception as e:
+            print(f"Joystick unavailable: {e}", flush=True)
+        self.control_server.start()
+        try:
+            self.application.run()
+        finally:
+            self.control_server.stop()
+            self.joystick.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Resident tracker that switches between tracking, joystick and idle on command")
+    parser.add_argument('--device_port', default="/dev/ttyUSB0", help="Dynamixel serial port")
+    parser.add_argument('--mode', choices=TrackerDaemon.MODES, default="idle", help="Mode to start in")
+    parser.add_argument('--control_address', default=CONTROL_ADDRESS, help="Socket to accept mode commands on")
+    parser.add_argument('--joystick', default="/dev/input/js0", help="PS4 controller input device")
+    parser.add_argument('--motion', choices=("pid", "profile"), default="pid", help="Host PID stepping or servo-side motion profiles")
+    parser.add_argument('--profile_velocity', type=int, default=0, help="Profile Velocity for --motion profile (0.229 rpm units, 0 is the servo's maximum)")
+    parser.add_argument('--profile_acceleration', type=int, default=1000, help="Profile Acceleration for --motion profile (214.577 rev/min^2 units)")
+    args = parser.parse_args()
+
+    from main import Application
+    import Jetson.GPIO as GPIO
+    app = Application(device_port=args.device_port, motion_mode=args.motion,
+                      profile_velocity=args.profile_velocity, profile_acceleration=args.profile_acceleration)
+    GPIO.setmode(GPIO.BOARD)
+    GPIO.setup(app.relay_pin, GPIO.OUT, initial=GPIO.LOW)
+    try:
+        TrackerDaemon(app, mode=args.mode, control_address=args.control_address, joystick_interface=args.joystick).run()
+    finally:
+        GPIO.cleanup()
@@ -0,0 +1,108 @@
+# File: tuning_channel.py
+
+import time
+import uuid
+import zmq
+
+# Local socket between the kiosk and the tracker process it starts
+TUNING_ADDRESS = "ipc:///tmp/wingman_tuning"
+
+PARAMETERS = ("pan_kp", "pan_ki", "pan_kd", "tilt_kp", "tilt_ki", "tilt_kd", "process_noise_cov", "measurement_noise_cov")
+
+
+class TuningPublisher:
+    """
+    Kiosk side of the live tuning channel. set() only records slider values; poll(), called
+    from the UI loop, sends them once the sliders have rested for `debounce` seconds, or at
+    the latest `max_delay` seconds after the first unsent change while a slider is dragged.
+    Each message carries every value set so far, so a tracker only ever needs the newest one,
+    and the state is repeated every `resend_interval` seconds for trackers started later.
+    Messages are JSON, never pickles: any local user can reach the socket.
+    """
+
+    def __init__(self, address=TUNING_ADDRESS, context=None, debounce=0.03, max_delay=0.1, resend_interval=1.0):
+        self.context = context if context is not None else zmq.Context.instance()
+        self.socket = self.context.socket(zmq.PUB)
+        self.socket.setsockopt(zmq.SNDHWM, 1)
+        self.socket.setsockopt(zmq.LINGER, 0)
+        self.socket.bind(address)
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.resend_interval = resend_interval
+
+        self.publisher_id = uuid.uuid4().hex
+        self.values = {}
+        self.version = 0
+        self.sent_version = 0
+        self._first_change = None
+        self._last_change = None
+        self._last_send = 0.0
+
+    def set(self, **values):
+        unknown = set(values) - set(PARAMETERS)
+        if unknown:
+            raise Exception(f"Unknown tuning parameters: {sorted(unknown)}")
+        self.values.update(values)
+        self.version += 1
+        now = time.monotonic()
+        if self._first_change is None:
+            self._first_change = now
+        self._last_change = now
+
+    def poll(self, now=None):
+        """Send if due; returns True when a message went out."""
+        if not self.values:
+            return False
+        now = time.monotonic() if now is None else now
+        if self.version != self.sent_version:
+            if now - self._last_change < self.debounce and now - self._first_change < self.max_delay:
+                return False
+        elif now - self._last_send < self.resend_interval:
+            return False
+        try:
+            self.socket.send_json({"publisher_id": self.publisher_id, "version": self.version, "values": dict(self.values)}, flags=zmq.NOBLOCK)
+        except zmq.Again:
+            return False
+        self.sent_version = self.version
+        self._first_change = None
+        self._last_send = now
+        return True
+
+    def close(self):
+        self.socket.close()
+
+
+class TuningSubscriber:
+    """
+    Tracker side of the live tuning channel. The socket only keeps the newest message
+    (CONFLATE), and poll() never blocks, so it can run once per frame.
+    """
+
+    def __init__(self, address=TUNING_ADDRESS, context=None):
+        self.context = context if context is not None else zmq.Context.instance()
+        self.socket = self.context.socket(zmq.SUB)
+        self.socket.setsockopt(zmq.CONFLATE, 1)
+        self.socket.setsockopt(zmq.LINGER, 0)
+        self.socket.setsockopt(zmq.SUBSCRIBE, b"")
+        self.socket.connect(address)
+        self._applied = None
+
+    def poll(self):
+        """Parameters changed since the last call as a dict, or None."""
+        try:
+            message = self.socket.recv_json(flags=zmq.NOBLOCK)
+        except zmq.Again:
+            return None
+        except ValueError:
+            return None  # Not JSON, not from the kiosk
+        if not isinstance(message, dict) or not isinstance(message.get("values"), dict):
+            return None
+        key = (message.get("publisher_id"), message.get("version"))
+        if key == self._applied:
+            return None  # A periodic resend of values already applied
+        self._applied = key
+        return {name: float(value) for name, value in message["values"].items()
+                if name in PARAMETERS and isinstance(value, (int, float)) and not isinstance(value, bool)}
+
+    def close(self):
+        self.socket.close()
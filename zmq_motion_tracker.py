@@ -1,22 +1,101 @@
 # Importing required libraries
 import depthai as dai
-import numpy as np
 import time
-import cv2
+import collections
+import threading
 import zmq
 import argparse
+from detections import DetectionBuffer
+import stream_protocol
+from frame_encoder import FrameEncoderPool, encode_frame
+from time_sync import TimeSyncServer
+from stream_quality import AdaptiveStreamQuality
 
 # Argument parser for FPS
 parser = argparse.ArgumentParser()
 parser.add_argument('--fps', type=int, default=60, help="FPS to set for the server's camera feed")
+parser.add_argument('--hwm', type=int, default=2, help="Messages queued per subscriber before new ones are dropped")
+parser.add_argument('--conflate', action="store_true", help="Keep only the newest message per subscriber (sent as one part; viewers that want pictures should subscribe to frames only)", default=False)
+parser.add_argument('--raw', action="store_true", help="Send raw BGR frames instead of JPEG", default=False)
+parser.add_argument('--quality', type=int, default=90, help="JPEG quality (the maximum when adapting)")
+parser.add_argument('--no_adaptive', action="store_true", help="Always send full frames at --quality", default=False)
+parser.add_argument('--encode_workers', type=int, default=2, help="Threads encoding frames in parallel")
+parser.add_argument('--max_in_flight', type=int, default=4, help="Frames queued for encoding before new pictures are skipped")
+parser.add_argument('--send_queue', type=int, default=8, help="Messages waiting for the socket before the oldest is dropped")
+parser.add_argument('--no_overlay', action="store_true", help="Send clean frames, receivers draw the boxes from the detections", default=False)
 args = parser.parse_args()
 
-# ZeroMQ setup
+# ZeroMQ setup. A small send high-water mark (or conflate) means a slow subscriber only ever
+# loses frames, the camera loop never waits on the network
 context = zmq.Context()
 socket = context.socket(zmq.PUB)
+socket.setsockopt(zmq.SNDHWM, args.hwm)
+if args.conflate:
+    socket.setsockopt(zmq.CONFLATE, 1)
 socket.bind("tcp://*:5555")
-responder = context.socket(zmq.REP)
-responder.bind("tcp://*:5556")
+# Time sync requests are answered on their own thread, independent of the frame rate
+time_sync_server = TimeSyncServer("tcp://*:5556", context)
+
+
+class StreamSender(threading.Thread):
+    """
+    Owns the PUB socket once started (ZMQ sockets are not thread-safe) and sends queued
+    messages as they come: detections from the camera loop right away, encoded frames as the
+    encoder pool finishes them. The send time is stamped here, just before sending.
+
+    At most `queue_size` messages wait; when it is full the oldest one is dropped, so a
+    stalled socket never makes messages pile up. Pictures are numbered (picture_seq) as they
+    are queued, so one dropped here shows up as a gap at a pictures-only subscriber.
+    """
+
+    def __init__(self, socket, queue_size=8):
+        super().__init__(name="StreamSender", daemon=True)
+        self.socket = socket
+        self.queue_size = queue_size
+        self.dropped = 0
+        self._picture_seq = 0
+        self._messages = collections.deque()
+        self._condition = threading.Condition()
+        self._stopped = False
+
+    def put(self, seq, detections, payload, payload_type, width, height, capture_timestamp, quality=0):
+        with self._condition:
+            picture_seq = 0
+            if payload_type != stream_protocol.PAYLOAD_NONE:
+                picture_seq = self._picture_seq
+                self._picture_seq = (self._picture_seq + 1) & 0xFF
+            if len(self._messages) >= self.queue_size:
+                self._messages.popleft()
+                self.dropped += 1
+            self._messages.append((seq, detections, payload, payload_type, width, height, capture_timestamp, quality, picture_seq))
+            self._condition.notify()
+
+    def run(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._messages or self._stopped)
+                if self._stopped:
+                    return
+                seq, detections, payload, payload_type, width, height, capture_timestamp, quality, picture_seq = self._messages.popleft()
+            parts = stream_protocol.encode_message(
+                seq, detections, payload, payload_type, width, height,
+                capture_timestamp, time.time(), quality, picture_seq)
+            try:
+                if args.conflate:
+                    self.socket.send(b"".join(parts), flags=zmq.NOBLOCK)
+                else:
+                    # The frame payload goes out without being copied into a pickle
+                    self.socket.send_multipart(parts, flags=zmq.NOBLOCK, copy=False)
+            except zmq.Again:
+                pass
+
+    def stop(self):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+        if self.is_alive():
+            self.join()
+
 
 class MotionTracker:
     def __init__(self, nnPath):
@@ -51,10 +130,22 @@ class MotionTracker:
         self.detectionNetwork.passthrough.link(self.xoutRgb.input)
         self.detectionNetwork.out.link(self.nnOut.input)
 
-    def frameNorm(self, frame, bbox):
-        normVals = np.full(len(bbox), frame.shape[0])
-        normVals[::2] = frame.shape[1]
-        return (np.clip(np.array(bbox), 0, 1) * normVals).astype(int)
+        # Detections are converted once per frame into preallocated structured arrays
+        self.detection_buffer = DetectionBuffer()
+        # Picture quality follows encode time and subscriber feedback; detections are sent every frame regardless
+        # With several encoders each frame may take that many frame periods to encode
+        self.quality = AdaptiveStreamQuality(fps=args.fps, quality=args.quality, encode_budget=0.5 * args.encode_workers,
+                                              adapt_quality=not args.raw) if not args.no_adaptive else None
+        self.sender = StreamSender(socket, args.send_queue)
+        self.encoder = FrameEncoderPool(self.frame_ready, args.encode_workers, args.max_in_flight)
+        self.encode_times = collections.deque(maxlen=64)  # Handed from the encoder threads to the camera loop
+
+    def frame_ready(self, seq, item, result):
+        """Called by the encoder pool, in frame order, with each finished picture."""
+        detections, capture_timestamp = item
+        payload, payload_type, quality, width, height, encode_time = result
+        self.encode_times.append(encode_time)
+        self.sender.put(seq, detections, payload, payload_type, width, height, capture_timestamp, quality)
 
     def run(self):
         with dai.Device(self.pipeline) as device:
@@ -62,7 +153,9 @@ class MotionTracker:
             qDet = device.getOutputQueue(name="nn", maxSize=4, blocking=False)
 
             frame = None
-            detections = []
+            detections = self.detection_buffer.fill([])
+            capture_timestamp = time.time()
+            seq = 0
 
             while True:
                 inRgb = qRgb.get()
@@ -70,37 +163,46 @@ class MotionTracker:
 
                 if inRgb is not None:
                     frame = inRgb.getCvFrame()
+                    # Capture time on this host's wall clock, for cross-host latency
+                    capture_timestamp = time.time() - (dai.Clock.now() - inRgb.getTimestamp()).total_seconds()
                 
                 if inDet is not None:
-                    detections = inDet.detections
+                    detections = self.detection_buffer.fill(inDet.detections)
 
                 if frame is not None:
-                    for detection in detections:
-                        bbox = self.frameNorm(frame, [detection.xmin, detection.ymin, detection.xmax, detection.ymax])
-                        cv2.rectangle(frame, (bbox[0], bbox[1]), (bbox[2], bbox[3]), (0, 255, 0), 2)
-
-                    ret, compressed_frame = cv2.imencode('.jpg', frame)
-                    socket.send_pyobj({
-                        "type": "frame_data",
-                        "frame": compressed_frame.tobytes(),
-                        "detections": detections,
-                        "send_timestamp": time.time()
-                    })
-
-                    # Listen for a time sync request from the client
-                    try:
-                        message = responder.recv_pyobj(flags=zmq.NOBLOCK)  # Non-blocking receive
-                        if message and message["type"] == "client_time_sync":
-                            responder.send_pyobj({
-                                "type": "server_time_sync",
-                                "client_timestamp": message["client_timestamp"],
-                                "server_timestamp": time.time()
-                            })
-                    except zmq.Again:
-                        pass  # No message received, continue
+                    # Detections are copied out of the ring buffer, which moves on while they wait to be sent.
+                    # They go out for every frame at once, never behind a picture that is still being encoded
+                    detections = detections.copy()
+                    self.sender.put(seq, detections, None, stream_protocol.PAYLOAD_NONE, frame.shape[1], frame.shape[0], capture_timestamp)
+
+                    send_frame = True
+                    if self.quality is not None:
+                        while self.encode_times:
+                            self.quality.record_encode(self.encode_times.popleft())
+                        self.quality.record_feedback(*time_sync_server.feedback())
+                        if self.quality.update():
+                            print(f"Stream settings: {self.quality.settings()}", flush=True)
+                        send_frame = self.quality.should_send_frame()
+
+                    # Never wait on the encoders; the picture message follows with the same seq
+                    if send_frame and not self.encoder.full():
+                        self.encoder.submit(
+                            seq, (detections, capture_timestamp), encode_frame, frame,
+                            boxes=None if args.no_overlay else detections["box"],
+                            scale=self.quality.scale if self.quality is not None else 1.0,
+                            quality=self.quality.quality if self.quality is not None else args.quality,
+                            raw=args.raw)
+                    seq += 1
 
 if __name__ == "__main__":
+    time_sync_server.start()
     motion_tracker = MotionTracker('yolo-v4-tiny-tf_openvino_2021.4_6shave.blob')
-    motion_tracker.run()
+    motion_tracker.sender.start()
+    try:
+        motion_tracker.run()
+    finally:
+        motion_tracker.encoder.close()
+        motion_tracker.sender.stop()
+        time_sync_server.stop()
 
 